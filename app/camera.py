@@ -0,0 +1,453 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Generic, Iterator, List, Optional, Tuple, TypeVar
+
+import cv2
+import numpy as np
+
+from app.metrics import metrics
+
+T = TypeVar("T")
+
+
+def encode_jpeg(frame: np.ndarray, quality: int = 95) -> Optional[bytes]:
+    """JPEG-encode a frame, returning None if encoding fails."""
+    ret, frame_jpeg = cv2.imencode(".jpeg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+    if not ret:
+        return None
+    return frame_jpeg.tobytes()
+
+
+def downscale(frame: np.ndarray, scale: float) -> np.ndarray:
+    if not 0 < scale < 1.0:
+        return frame
+    height, width = frame.shape[:2]
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+class FrameQueue:
+    """Bounded FIFO that drops the oldest frame instead of blocking the producer."""
+
+    def __init__(self, maxsize: int):
+        self._frames = deque(maxlen=max(1, maxsize))
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item) -> bool:
+        """Append `item`; returns whether the oldest frame was dropped to make room."""
+        with self._cond:
+            dropped = len(self._frames) == self._frames.maxlen
+            if dropped:
+                self.dropped += 1
+            self._frames.append(item)
+            self._cond.notify()
+        return dropped
+
+    def get(self):
+        """Next item, or None once the queue is closed and empty."""
+        with self._cond:
+            while not self._frames and not self._closed:
+                self._cond.wait()
+            if not self._frames:
+                return None
+            return self._frames.popleft()
+
+    def close(self, discard: bool = False):
+        """Stop accepting frames; queued frames are still handed out unless `discard` is set."""
+        with self._cond:
+            self._closed = True
+            if discard:
+                self._frames.clear()
+            self._cond.notify_all()
+
+
+class MotionGate:
+    """Decides per captured frame whether to publish it, and at which quality and scale.
+
+    Change detection runs on a strided grayscale thumbnail (about `detect_width`
+    pixels wide) that is compared against the thumbnail of the last published
+    frame. While `active()` reports that the car or camera is moving, every
+    frame is published at full quality. Otherwise frames whose changed-pixel
+    fraction stays below `motion_threshold` are skipped, changed scenes are
+    throttled to `idle_fps` (0 = unthrottled) at `idle_quality` and
+    `idle_scale`, and a full quality keyframe goes out every
+    `keyframe_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        active: Callable[[], bool] = lambda: False,
+        quality: int = 95,
+        idle_quality: int = 70,
+        idle_scale: float = 1.0,
+        idle_fps: float = 5.0,
+        change_threshold: int = 12,
+        motion_threshold: float = 0.01,
+        keyframe_interval: float = 5.0,
+        active_hold: float = 0.5,
+        detect_width: int = 80,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.active = active
+        self.quality = quality
+        self.idle_quality = idle_quality
+        self.idle_scale = idle_scale
+        self.idle_fps = idle_fps
+        self.change_threshold = change_threshold
+        self.motion_threshold = motion_threshold
+        self.keyframe_interval = keyframe_interval
+        self.active_hold = active_hold
+        self.detect_width = max(1, detect_width)
+        self.clock = clock
+        self._reference: Optional[np.ndarray] = None
+        self._last_publish: Optional[float] = None
+        self._last_keyframe: Optional[float] = None
+        self._active_until = float("-inf")
+        self.skipped = 0
+
+    def thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        """Grayscale copy of `frame` subsampled to roughly `detect_width` pixels across."""
+        step = max(1, frame.shape[1] // self.detect_width)
+        small = frame[::step, ::step]
+        if small.ndim == 3:
+            return small.mean(axis=2, dtype=np.float32)
+        return small.astype(np.float32)
+
+    def change(self, thumbnail: np.ndarray) -> float:
+        """Fraction of thumbnail pixels that differ from the reference by more than `change_threshold`."""
+        if self._reference is None or self._reference.shape != thumbnail.shape:
+            return 1.0
+        return np.count_nonzero(np.abs(thumbnail - self._reference) > self.change_threshold) / thumbnail.size
+
+    def __call__(self, frame: np.ndarray) -> Optional[Tuple[int, float]]:
+        """(quality, scale) to encode `frame` with, or None to skip it."""
+        now = self.clock()
+        if self.active():
+            self._active_until = now + self.active_hold
+        thumbnail = self.thumbnail(frame)
+
+        keyframe = now < self._active_until or (
+            self._last_keyframe is None or now - self._last_keyframe >= self.keyframe_interval
+        )
+        if keyframe:
+            decision = (self.quality, 1.0)
+            self._last_keyframe = now
+        elif self.change(thumbnail) < self.motion_threshold:
+            decision = None
+        elif self.idle_fps > 0 and now - self._last_publish < 1.0 / self.idle_fps:
+            decision = None
+        else:
+            decision = (self.idle_quality, self.idle_scale)
+
+        if decision is None:
+            self.skipped += 1
+            metrics.count("camera.frames_skipped")
+            return None
+        self._reference = thumbnail
+        self._last_publish = now
+        return decision
+
+
+class CameraPipeline:
+    """Staged capture -> encode -> publish pipeline.
+
+    A capture thread feeds a bounded queue that drops the oldest frames when the
+    encoders fall behind. A pool of encoder threads JPEG-encodes frames in
+    parallel (cv2 releases the GIL), and a publisher thread hands the results to
+    `sink` in capture order. An optional `gate` (see `MotionGate`) picks the
+    quality and scale of each frame, or skips it, before it is queued.
+    """
+
+    def __init__(
+        self,
+        capture: Callable[[], np.ndarray],
+        sink: Callable[[int, float, bytes], None],
+        encoders: int = 2,
+        quality: int = 95,
+        fps: float = 0.0,
+        queue_size: int = 2,
+        gate: Optional[Callable[[np.ndarray], Optional[Tuple[int, float]]]] = None,
+    ):
+        self.capture = capture
+        self.sink = sink
+        self.encoders = max(1, encoders)
+        self.quality = quality
+        self.fps = fps
+        self.queue = FrameQueue(queue_size)
+        self.gate = gate
+
+        self._running = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._take_lock = threading.Lock()
+        self._next_order = 0
+        self._results: Dict[int, Tuple[int, float, Optional[bytes]]] = {}
+        self._results_cond = threading.Condition()
+        self.published = 0
+        self.stale = 0
+
+    @property
+    def dropped(self) -> int:
+        """Frames dropped before encoding plus encoded frames skipped as stale."""
+        return self.queue.dropped + self.stale
+
+    def start(self):
+        self._running.set()
+        self._threads = [threading.Thread(target=self._capture_loop, name="camera-capture", daemon=True)]
+        self._threads += [
+            threading.Thread(target=self._encode_loop, name=f"camera-encode-{i}", daemon=True)
+            for i in range(self.encoders)
+        ]
+        self._threads.append(threading.Thread(target=self._publish_loop, name="camera-publish", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running.clear()
+        self.queue.close(discard=True)
+        with self._results_cond:
+            self._results_cond.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _capture_loop(self):
+        period = 1.0 / self.fps if self.fps > 0 else 0.0
+        next_capture = time.monotonic()
+        frame_id = 0
+        while self._running.is_set():
+            if period:
+                delay = next_capture - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_capture = max(next_capture + period, time.monotonic())
+            try:
+                with metrics.timer("camera.capture"):
+                    frame = self.capture()
+            except Exception as e:
+                logging.error(f"Error while capturing image: {e}")
+                self._running.clear()
+                break
+            metrics.count("camera.frames_captured")
+            captured_at = time.monotonic()
+            if self.gate is None:
+                quality, scale = self.quality, 1.0
+            else:
+                decision = self.gate(frame)
+                if decision is None:
+                    frame_id += 1
+                    continue
+                quality, scale = decision
+            if self.queue.put((frame_id, captured_at, frame, quality, scale)):
+                metrics.count("camera.frames_dropped")
+            frame_id += 1
+        self.queue.close()
+        with self._results_cond:
+            self._results_cond.notify_all()
+
+    def _encode_loop(self):
+        while True:
+            # Take and number frames under one lock so the publisher can restore capture order
+            with self._take_lock:
+                item = self.queue.get()
+                if item is None:
+                    return
+                order = self._next_order
+                self._next_order += 1
+            frame_id, captured_at, frame, quality, scale = item
+            try:
+                with metrics.timer("camera.encode"):
+                    data = encode_jpeg(downscale(frame, scale), quality)
+                if data is None:
+                    logging.error("Error: Could not encode frame to JPEG.")
+            except Exception as e:
+                logging.error(f"Error while encoding image: {e}")
+                data = None
+            with self._results_cond:
+                self._results[order] = (frame_id, captured_at, data)
+                self._results_cond.notify_all()
+
+    def _publish_loop(self):
+        order = 0
+        while True:
+            with self._results_cond:
+                while order not in self._results:
+                    if not self._running.is_set() and not self._encoders_alive():
+                        return
+                    self._results_cond.wait(0.1)
+                # More frames are ready than the encoders produce in parallel, so the
+                # sink is behind: skip stale frames rather than add latency
+                while order + 1 in self._results and order + self.encoders in self._results:
+                    if self._results.pop(order)[2] is not None:
+                        self.stale += 1
+                        metrics.count("camera.frames_dropped")
+                    order += 1
+                frame_id, captured_at, data = self._results.pop(order)
+            order += 1
+            if data is None:
+                continue
+            try:
+                with metrics.timer("camera.publish"):
+                    self.sink(frame_id, captured_at, data)
+                self.published += 1
+                metrics.count("camera.frames_published")
+                metrics.observe("camera.capture_to_publish", time.monotonic() - captured_at)
+            except Exception as e:
+                logging.error(f"Error while publishing image: {e}")
+
+    def _encoders_alive(self) -> bool:
+        return any(t.is_alive() for t in self._threads if t.name.startswith("camera-encode"))
+
+
+class FrameRing:
+    """Preallocated ring buffer holding the latest raw frames.
+
+    Frames are copied into a single array allocated on the first push, so
+    steady-state capture does not allocate. Readers hold a slot lock while they
+    use a frame, which keeps the writer from overwriting it mid-encode.
+    """
+
+    def __init__(self, size: int = 4):
+        self.size = max(1, size)
+        self._frames: Optional[np.ndarray] = None
+        self._ids = [-1] * self.size
+        self._slot_locks = [threading.Lock() for _ in range(self.size)]
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._latest_id: Optional[int] = None
+        self._pushed = threading.Event()
+
+    @property
+    def latest_id(self) -> Optional[int]:
+        return self._latest_id
+
+    @property
+    def shape(self) -> Optional[Tuple[int, ...]]:
+        """Shape of the buffered frames, or None before the first push."""
+        return self._frames.shape[1:] if self._frames is not None else None
+
+    def push(self, frame: np.ndarray) -> int:
+        with self._lock:
+            if self._frames is None:
+                self._frames = np.empty((self.size, *frame.shape), dtype=frame.dtype)
+            frame_id = self._next_id
+            self._next_id += 1
+        slot = frame_id % self.size
+        with self._slot_locks[slot]:
+            np.copyto(self._frames[slot], frame)
+            self._ids[slot] = frame_id
+        self._latest_id = frame_id
+        self._pushed.set()
+        return frame_id
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the ring holds a frame; returns False on timeout."""
+        return self._pushed.wait(timeout)
+
+    @contextmanager
+    def frame(self, frame_id: int) -> Iterator[Optional[np.ndarray]]:
+        """View of frame `frame_id` while the context is open, or None if it was overwritten."""
+        slot = frame_id % self.size
+        with self._slot_locks[slot]:
+            if self._frames is None or self._ids[slot] != frame_id:
+                yield None
+            else:
+                yield self._frames[slot]
+
+
+class _Encoding:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class LazyEncoder(Generic[T]):
+    """Encodes ring-buffer frames on first request and memoizes the result.
+
+    Results are cached per (frame id, quality, scale), so concurrent requests
+    for the same variant of a frame share a single encode.
+    """
+
+    def __init__(
+        self,
+        ring: FrameRing,
+        make_message: Callable[[int, bytes], T],
+        quality: int = 95,
+        capacity: int = 8,
+        min_size: int = 16,
+    ):
+        self.ring = ring
+        self.make_message = make_message
+        self.quality = quality
+        self.capacity = max(1, capacity)
+        self.min_size = min_size
+        self._cache: "OrderedDict[Tuple[int, int, float], _Encoding]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.encodes = 0
+
+    def get(self, quality: Optional[float] = None, scale: Optional[float] = None) -> Optional[T]:
+        """Message for the latest frame, or None if no frame has been captured yet.
+
+        `quality` is clamped to 1-100. A `scale` outside (0, 1] means full
+        resolution, and small scales are raised so the image stays at least
+        `min_size` pixels on its shorter side. Missing or NaN values use the
+        defaults.
+        """
+        frame_id = self.ring.latest_id
+        if frame_id is None:
+            return None
+        key = (frame_id, self._quality(quality), self._scale(scale))
+        with self._lock:
+            entry = self._cache.get(key)
+            owner = entry is None
+            if owner:
+                entry = _Encoding()
+                self._cache[key] = entry
+                while len(self._cache) > self.capacity:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(key)
+        if owner:
+            try:
+                entry.result = self._encode(*key)
+            finally:
+                entry.done.set()
+                if entry.result is None:
+                    with self._lock:
+                        self._cache.pop(key, None)
+        else:
+            entry.done.wait()
+        return entry.result
+
+    def _quality(self, quality: Optional[float]) -> int:
+        if not quality or quality != quality:
+            return self.quality
+        return int(max(1, min(100, quality)))
+
+    def _scale(self, scale: Optional[float]) -> float:
+        if scale is None or not 0 < scale < 1:
+            return 1.0
+        shape = self.ring.shape
+        if shape is not None:
+            scale = max(scale, self.min_size / min(shape[:2]))
+        return min(1.0, float(scale))
+
+    def _encode(self, frame_id: int, quality: int, scale: float) -> Optional[T]:
+        with self.ring.frame(frame_id) as frame:
+            if frame is None:
+                return None
+            with metrics.timer("camera.encode_on_demand"):
+                data = encode_jpeg(downscale(frame, scale), quality)
+        self.encodes += 1
+        if data is None:
+            logging.error("Error: Could not encode frame to JPEG.")
+            return None
+        return self.make_message(frame_id, data)
@@ -0,0 +1,170 @@
+import logging
+import math
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from app.external.Motor import Motor
+from app.external.bus import EMERGENCY, MOTOR, bus_priority
+
+
+def wheel_speeds(x: float, y: float, max_speed: int = 1000) -> Tuple[int, int]:
+    """Convert a BEV vector to left/right wheel speeds.
+
+    Positive x → right turn (left wheel faster)
+    Positive y → forward
+    """
+    # Clamp vector magnitude to 1 (optional safety)
+    mag = math.sqrt(x * x + y * y)
+    if mag > 1:
+        x /= mag
+        y /= mag
+
+    left = y + x  # Right turn: left wheel goes faster
+    right = y - x  # Right turn: right wheel slows down
+
+    # Normalize if needed to avoid exceeding [-1, 1]
+    max_val = max(abs(left), abs(right))
+    if max_val > 1:
+        left /= max_val
+        right /= max_val
+
+    return int(left * max_speed), int(right * max_speed)
+
+
+def wheel_speeds_batch(x, y, max_speed: int = 1000) -> Tuple[np.ndarray, np.ndarray]:
+    """`wheel_speeds` over arrays of setpoints, e.g. for trajectory preview or replay."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    mag = np.maximum(np.sqrt(x * x + y * y), 1.0)
+    x = x / mag
+    y = y / mag
+
+    left = y + x
+    right = y - x
+
+    max_val = np.maximum(np.maximum(np.abs(left), np.abs(right)), 1.0)
+    return (left / max_val * max_speed).astype(np.int64), (right / max_val * max_speed).astype(np.int64)
+
+
+class DriveScheduler:
+    """Owns the motors and runs drive commands without blocking the caller.
+
+    Every command carries an absolute deadline on the monotonic clock. A newer
+    command replaces the running one together with its deadline, and a watchdog
+    thread stops the motors once the current deadline has passed. Commands
+    submitted with an acceleration limit are ramped towards at `rate` Hz,
+    including the stop when their deadline passes.
+    """
+
+    def __init__(self, motor: Motor, clock: Callable[[], float] = time.monotonic, rate: float = 50.0):
+        self.motor = motor
+        self.clock = clock
+        self.rate = rate
+        self._cond = threading.Condition()
+        self._target: Tuple[int, int] = (0, 0)
+        self._accel: Optional[float] = None
+        self._changed = False
+        self._deadline: Optional[float] = None
+        self._speeds: Tuple[int, int] = (0, 0)
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="drive-scheduler", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._apply((0, 0))
+
+    def submit(self, left: int, right: int, duration: float, accel: Optional[float] = None):
+        """Drive with the given wheel speeds for `duration` seconds, replacing any running command.
+
+        With `accel` (wheel speed units per second) the speeds ramp towards the
+        target instead of jumping to it.
+        """
+        with self._cond:
+            self._target = (left, right)
+            self._accel = accel
+            self._changed = True
+            self._deadline = self.clock() + max(0.0, duration)
+            self._cond.notify()
+
+    def halt(self):
+        """Stop the motors as soon as possible."""
+        self.submit(0, 0, 0.0)
+
+    @property
+    def deadline(self) -> Optional[float]:
+        with self._cond:
+            return self._deadline
+
+    @property
+    def speeds(self) -> Tuple[int, int]:
+        """Wheel speeds last written to the motors."""
+        return self._speeds
+
+    def _run(self):
+        last_step = self.clock()
+        next_step = last_step
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+                    now = self.clock()
+                    if self._deadline is not None and now >= self._deadline:
+                        self._target = (0, 0)
+                        self._deadline = None
+                        self._changed = True
+                    ramping = self._speeds != self._target
+                    if self._changed or (ramping and now >= next_step):
+                        break
+                    timeouts = []
+                    if self._deadline is not None:
+                        timeouts.append(self._deadline - now)
+                    if ramping:
+                        timeouts.append(next_step - now)
+                    self._cond.wait(min(timeouts) if timeouts else None)
+                self._changed = False
+                period = 1.0 / self.rate
+                speeds = self._ramp(self._speeds, self._target, self._accel, min(now - last_step, period))
+            last_step = now
+            next_step = now + period
+            self._apply(speeds)
+
+    @staticmethod
+    def _ramp(current: Tuple[int, int], target: Tuple[int, int], accel: Optional[float], dt: float):
+        if not accel:
+            return target
+        # At least one unit per step so slow ramps still converge
+        max_delta = max(1.0, accel * dt)
+        return tuple(int(round(c + max(-max_delta, min(max_delta, t - c)))) for c, t in zip(current, target))
+
+    def _apply(self, speeds: Tuple[int, int]):
+        left, right = speeds
+        # Stops jump the bus queue ahead of everything else
+        priority = EMERGENCY if speeds == (0, 0) else MOTOR
+        try:
+            with bus_priority(priority):
+                self.motor.setMotorModel(
+                    front_left=left,
+                    rear_left=left,
+                    front_right=right,
+                    rear_right=right,
+                )
+            self._speeds = speeds
+        except Exception as e:
+            logging.error(f"Error while setting motor speeds: {e}")
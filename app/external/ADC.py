@@ -3,9 +3,9 @@ import time
 
 
 class Adc:
-    def __init__(self):
+    def __init__(self, bus=None):
         # Get I2C bus
-        self.bus = smbus.SMBus(1)
+        self.bus = bus if bus is not None else smbus.SMBus(1)
 
         # I2C address of the device
         self.ADDRESS = 0x48
@@ -16,6 +16,9 @@ class Adc:
         # ADS7830 Command
         self.ADS7830_CMD = 0x84  # Single-Ended Inputs
 
+        # Give up waiting for two consecutive reads to agree after this many tries
+        self.retries = 10
+
         for i in range(3):
             aa = self.bus.read_byte_data(self.ADDRESS, 0xF4)
             if aa < 150:
@@ -34,7 +37,7 @@ class Adc:
         self.bus.write_byte_data(self.ADDRESS, cmd, value)
 
     def recvPCF8591(self, channel):  # PCF8591 write DAC value
-        while 1:
+        for i in range(self.retries):
             value1 = self.analogReadPCF8591(
                 channel
             )  # read the ADC value of channel 0,1,2,
@@ -51,7 +54,7 @@ class Adc:
                 (((channel << 2) | (channel >> 1)) & 0x07) << 4
         )
         self.bus.write_byte(self.ADDRESS, COMMAND_SET)
-        while 1:
+        for i in range(self.retries):
             value1 = self.bus.read_byte(self.ADDRESS)
             value2 = self.bus.read_byte(self.ADDRESS)
             if value1 == value2:
@@ -67,6 +70,22 @@ class Adc:
             data = self.recvADS7830(channel)
         return data
 
+    def sampleADC(self, channel):
+        """Single conversion without the read-until-stable loop, for callers that filter over time"""
+        if self.Index == "PCF8591":
+            # The first read starts the conversion and returns the previous result
+            self.bus.read_byte_data(self.ADDRESS, self.PCF8591_CMD + channel)
+            value = self.bus.read_byte_data(self.ADDRESS, self.PCF8591_CMD + channel)
+            voltage = value / 256.0 * 3.3
+        else:
+            COMMAND_SET = self.ADS7830_CMD | (
+                    (((channel << 2) | (channel >> 1)) & 0x07) << 4
+            )
+            self.bus.write_byte(self.ADDRESS, COMMAND_SET)
+            value = self.bus.read_byte(self.ADDRESS)
+            voltage = value / 255.0 * 3.3
+        return round(voltage, 2)
+
     def i2cClose(self):
         self.bus.close()
 
@@ -5,12 +5,13 @@ import time
 
 
 class Motor:
-    def __init__(self):
-        self.pwm = PCA9685(0x40, debug=True)
+    def __init__(self, pwm=None, adc=None):
+        self.pwm = pwm if pwm else PCA9685(0x40, debug=True)
         self.pwm.setPWMFreq(50)
         self.time_proportion = 2.5  # Depend on your own car,If you want to get the best out of the rotation mode,
         # change the value by experimenting.
-        self.adc = Adc()
+        self.adc = adc if adc else Adc()
+        self.telemetry = None  # optional TelemetrySampler providing a filtered battery voltage
 
     @staticmethod
     def duty_range(duty1, duty2, duty3, duty4):
@@ -35,62 +36,46 @@ class Motor:
             duty4 = -4095
         return duty1, duty2, duty3, duty4
 
-    def left_Upper_Wheel(self, duty):
+    @staticmethod
+    def wheel_duties(duty, forward, backward):
+        """Channel duties for one wheel, `forward`/`backward` are its PCA9685 channels"""
         if duty > 0:
-            self.pwm.setMotorPwm(0, 0)
-            self.pwm.setMotorPwm(1, duty)
+            return {backward: 0, forward: duty}
         elif duty < 0:
-            self.pwm.setMotorPwm(1, 0)
-            self.pwm.setMotorPwm(0, abs(duty))
+            return {forward: 0, backward: abs(duty)}
         else:
-            self.pwm.setMotorPwm(0, 4095)
-            self.pwm.setMotorPwm(1, 4095)
+            return {forward: 4095, backward: 4095}
+
+    def left_Upper_Wheel(self, duty):
+        self.pwm.setMotorPwms(self.wheel_duties(duty, 1, 0))
 
     def left_Lower_Wheel(self, duty):
-        if duty > 0:
-            self.pwm.setMotorPwm(3, 0)
-            self.pwm.setMotorPwm(2, duty)
-        elif duty < 0:
-            self.pwm.setMotorPwm(2, 0)
-            self.pwm.setMotorPwm(3, abs(duty))
-        else:
-            self.pwm.setMotorPwm(2, 4095)
-            self.pwm.setMotorPwm(3, 4095)
+        self.pwm.setMotorPwms(self.wheel_duties(duty, 2, 3))
 
     def right_Upper_Wheel(self, duty):
-        if duty > 0:
-            self.pwm.setMotorPwm(6, 0)
-            self.pwm.setMotorPwm(7, duty)
-        elif duty < 0:
-            self.pwm.setMotorPwm(7, 0)
-            self.pwm.setMotorPwm(6, abs(duty))
-        else:
-            self.pwm.setMotorPwm(6, 4095)
-            self.pwm.setMotorPwm(7, 4095)
+        self.pwm.setMotorPwms(self.wheel_duties(duty, 7, 6))
 
     def right_Lower_Wheel(self, duty):
-        if duty > 0:
-            self.pwm.setMotorPwm(4, 0)
-            self.pwm.setMotorPwm(5, duty)
-        elif duty < 0:
-            self.pwm.setMotorPwm(5, 0)
-            self.pwm.setMotorPwm(4, abs(duty))
-        else:
-            self.pwm.setMotorPwm(4, 4095)
-            self.pwm.setMotorPwm(5, 4095)
+        self.pwm.setMotorPwms(self.wheel_duties(duty, 5, 4))
 
     def setMotorModel(self, front_left, rear_left, front_right, rear_right):
         front_left, rear_left, front_right, rear_right = self.duty_range(
             front_left, rear_left, front_right, rear_right
         )
-        self.left_Upper_Wheel(front_left)
-        self.left_Lower_Wheel(rear_left)
-        self.right_Upper_Wheel(front_right)
-        self.right_Lower_Wheel(rear_right)
+        # All four wheels go out as one PCA9685 frame (channels 0-7)
+        duties = {}
+        duties.update(self.wheel_duties(front_left, 1, 0))
+        duties.update(self.wheel_duties(rear_left, 2, 3))
+        duties.update(self.wheel_duties(front_right, 7, 6))
+        duties.update(self.wheel_duties(rear_right, 5, 4))
+        self.pwm.setMotorPwms(duties)
 
     def Rotate(self, n):
         angle = n
-        bat_compensate = 7.5 / (self.adc.recvADC(2) * 3)
+        voltage = self.telemetry.battery_voltage() if self.telemetry else None
+        if voltage is None:
+            voltage = self.adc.recvADC(2) * 3
+        bat_compensate = 7.5 / voltage
         while True:
             W = 2000
 
@@ -102,7 +87,7 @@ class Motor:
             BL = VY - VX - W
             BR = VY + VX + W
 
-            PWM.setMotorModel(FL, BL, FR, BR)
+            self.setMotorModel(FL, BL, FR, BR)
             print("rotating")
             time.sleep(5 * self.time_proportion * bat_compensate / 1000)
             angle -= 5
@@ -2,6 +2,7 @@
 
 import time
 import math
+import threading
 import smbus2 as smbus
 
 
@@ -25,12 +26,21 @@ class PCA9685:
     __ALLLED_ON_H = 0xFB
     __ALLLED_OFF_L = 0xFC
     __ALLLED_OFF_H = 0xFD
+    __MODE1_AI = 0x20  # register auto-increment
+    __CHANNELS = 16
+    __BLOCK_MAX = 32  # SMBus block transfer limit
+    __BLOCK_GAP = 4  # rewrite up to this many clean bytes rather than start a new transaction
 
-    def __init__(self, address=0x40, debug=False):
-        self.bus = smbus.SMBus(1)
+    def __init__(self, address=0x40, debug=False, bus=None):
+        self.bus = bus if bus is not None else smbus.SMBus(1)
         self.address = address
         self.debug = debug
-        self.write(self.__MODE1, 0x00)
+        # Shadow copy of the LED0..LED15 ON/OFF registers; None until written once
+        self._shadow = [None] * (4 * self.__CHANNELS)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.freq = None
+        self.write(self.__MODE1, self.__MODE1_AI)
 
     def write(self, reg, value):
         "Writes an 8-bit value to the specified register/address"
@@ -43,6 +53,8 @@ class PCA9685:
 
     def setPWMFreq(self, freq):
         "Sets the PWM frequency"
+        if freq == self.freq:
+            return  # already running at this frequency, skip the sleep/restart sequence
         prescaleval = 25000000.0  # 25MHz
         prescaleval /= 4096.0  # 12-bit
         prescaleval /= float(freq)
@@ -56,24 +68,106 @@ class PCA9685:
         self.write(self.__MODE1, oldmode)
         time.sleep(0.005)
         self.write(self.__MODE1, oldmode | 0x80)
+        self.freq = freq
 
     def setPWM(self, channel, on, off):
         "Sets a single PWM channel"
-        on = int(on)
-        off = int(off)
-        self.write(self.__LED0_ON_L + 4 * channel, on & 0xFF)
-        self.write(self.__LED0_ON_H + 4 * channel, on >> 8)
-        self.write(self.__LED0_OFF_L + 4 * channel, off & 0xFF)
-        self.write(self.__LED0_OFF_H + 4 * channel, off >> 8)
+        self.setPWMFrame({channel: (on, off)})
+
+    def setPWMFrame(self, frame):
+        """Sets several PWM channels at once.
+
+        `frame` maps channel -> (on, off). Only registers that differ from the
+        shadow copy are sent, grouped into auto-increment block writes. On a
+        bus that can queue writes (BusManager) they are queued under the lock,
+        in the same order as the shadow updates, and waited for after releasing
+        it, so callers sharing the device wait on the bus in priority order
+        rather than on each other.
+        """
+        queued = []
+        with self._lock:
+            for channel, (on, off) in frame.items():
+                on = int(on)
+                off = int(off)
+                base = 4 * channel
+                self._stage(base, on & 0xFF)
+                self._stage(base + 1, on >> 8)
+                self._stage(base + 2, off & 0xFF)
+                self._stage(base + 3, off >> 8)
+            for start, data in self._commit():
+                if hasattr(self.bus, "enqueue_i2c_block_data"):
+                    queued.append((start, data, self.bus.enqueue_i2c_block_data(
+                        self.address, self.__LED0_ON_L + start, data)))
+                else:
+                    self._send(start, data)
+        for i, (start, data, txn) in enumerate(queued):
+            try:
+                self.bus.wait(txn)
+            except Exception:
+                for failed_start, failed_data, _ in queued[i:]:
+                    self._forget(failed_start, failed_data)
+                raise
+
+    def _stage(self, index, value):
+        if self._shadow[index] != value:
+            self._pending[index] = value
+
+    def _commit(self):
+        "Turns the pending bytes into (start, data) writes and applies them to the shadow"
+        pending = self._pending
+        if not pending:
+            return []
+        self._pending = {}
+        writes = []
+        for start, end in self._spans(sorted(pending)):
+            data = [pending.get(i, self._shadow[i]) for i in range(start, end + 1)]
+            self._shadow[start:end + 1] = data
+            writes.append((start, data))
+        return writes
+
+    def _send(self, start, data):
+        try:
+            if len(data) == 1:
+                self.write(self.__LED0_ON_L + start, data[0])
+            else:
+                self.bus.write_i2c_block_data(self.address, self.__LED0_ON_L + start, data)
+        except Exception:
+            self._shadow[start:start + len(data)] = [None] * len(data)
+            raise
+
+    def _forget(self, start, data):
+        "Marks bytes whose write failed as unknown so the next frame resends them"
+        with self._lock:
+            self._shadow[start:start + len(data)] = [None] * len(data)
+
+    def _spans(self, indices):
+        "Groups dirty shadow indices into (start, end) runs that fit one block write"
+        start = end = indices[0]
+        for index in indices[1:]:
+            gap_known = all(self._shadow[i] is not None for i in range(end + 1, index))
+            if index - end <= self.__BLOCK_GAP and index - start < self.__BLOCK_MAX and gap_known:
+                end = index
+            else:
+                yield start, end
+                start = end = index
+        yield start, end
 
     def setMotorPwm(self, channel, duty):
         self.setPWM(channel, 0, duty)
 
+    def setMotorPwms(self, duties):
+        "Sets several motor channels at once, `duties` maps channel -> duty"
+        self.setPWMFrame({channel: (0, duty) for channel, duty in duties.items()})
+
     def setServoPulse(self, channel, pulse):
         "Sets the Servo Pulse,The PWM frequency must be 50HZ"
         pulse = pulse * 4096 / 20000  # PWM frequency is 50HZ,the period is 20000us
         self.setPWM(channel, 0, int(pulse))
 
+    def setServoPulses(self, pulses):
+        "Sets several servo channels at once, `pulses` maps channel -> pulse in us"
+        self.setPWMFrame({channel: (0, int(pulse * 4096 / 20000)) for channel, pulse in pulses.items()})
+
 
 if __name__ == "__main__":
     pass
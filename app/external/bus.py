@@ -0,0 +1,246 @@
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+import smbus2 as smbus
+
+from app.external.ADC import Adc
+from app.external.PCA9685 import PCA9685
+from app.metrics import metrics
+
+# Transaction priorities, lower runs first
+EMERGENCY = 0
+MOTOR = 1
+SERVO = 2
+ADC = 3
+
+_priority = contextvars.ContextVar("i2c_priority", default=ADC)
+
+
+@contextmanager
+def bus_priority(priority):
+    """Run the bus transactions issued inside the block at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Transaction:
+    __slots__ = ("op", "address", "register", "data", "done", "result", "error")
+
+    def __init__(self, op, address, register=None, data=()):
+        self.op = op
+        self.address = address
+        self.register = register
+        self.data = list(data)
+        self.done = False
+        self.result = None
+        self.error = None
+
+    def run(self, bus):
+        try:
+            if self.op == "write_byte_data":
+                bus.write_byte_data(self.address, self.register, self.data[0])
+            elif self.op == "write_i2c_block_data":
+                bus.write_i2c_block_data(self.address, self.register, self.data)
+            elif self.op == "write_byte":
+                bus.write_byte(self.address, self.data[0])
+            elif self.op == "read_byte_data":
+                self.result = bus.read_byte_data(self.address, self.register)
+            elif self.op == "read_byte":
+                self.result = bus.read_byte(self.address)
+        except Exception as e:
+            self.error = e
+
+    @property
+    def size(self):
+        """Bytes on the wire after the address: register, payload and any byte read back."""
+        return (self.register is not None) + len(self.data) + self.op.startswith("read")
+
+
+class BusManager:
+    """Single owner of the I2C bus, shared by all drivers.
+
+    Implements the SMBus calls the drivers use. Concurrent transactions run one
+    at a time in priority order (see `bus_priority`); the calling thread that
+    finds the bus idle runs queued transactions until its own has completed.
+    Register writes to an auto-increment device supersede the bytes they
+    overlap in any older pending write, so the newest value lands last even
+    when the older write runs later. Pending writes to the same device at the
+    same priority are merged into one block write. Devices are created once
+    per address and shared.
+    """
+
+    __BLOCK_MAX = 32
+
+    def __init__(self, bus=None, bus_number=1):
+        self._bus = bus
+        self._bus_number = bus_number
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._executing = False
+        self._devices = {}
+        self._devices_lock = threading.Lock()
+        self._auto_increment = set()
+        self._metric_names = {}
+        self.transactions = 0
+        self.merged = 0
+
+    def pca9685(self, address=0x40, freq=50):
+        """Shared PCA9685 at `address`, initialized and set to `freq` only once."""
+        with self._devices_lock:
+            device = self._devices.get(address)
+            if device is None:
+                device = PCA9685(address, debug=True, bus=self)
+                device.setPWMFreq(freq)
+                self._devices[address] = device
+                self._auto_increment.add(address)
+            return device
+
+    def adc(self):
+        with self._devices_lock:
+            device = self._devices.get("adc")
+            if device is None:
+                device = Adc(bus=self)
+                self._devices["adc"] = device
+            return device
+
+    def write_byte_data(self, address, register, value):
+        self._submit(_Transaction("write_byte_data", address, register, [value]))
+
+    def write_i2c_block_data(self, address, register, data):
+        self._submit(_Transaction("write_i2c_block_data", address, register, data))
+
+    def enqueue_i2c_block_data(self, address, register, data):
+        """Queue a register write without waiting for it; pass the result to `wait`.
+
+        Lets a driver queue its writes in order under its own lock and wait for
+        them after releasing it.
+        """
+        return self._enqueue(_Transaction("write_i2c_block_data", address, register, data))
+
+    def wait(self, txn):
+        """Wait for a transaction returned by an `enqueue_*` call and return its result."""
+        with self._cond:
+            while not txn.done:
+                if self._executing:
+                    self._cond.wait()
+                    continue
+                self._execute_until(txn)
+        if txn.error is not None:
+            raise txn.error
+        return txn.result
+
+    def write_byte(self, address, value):
+        self._submit(_Transaction("write_byte", address, data=[value]))
+
+    def read_byte_data(self, address, register):
+        return self._submit(_Transaction("read_byte_data", address, register))
+
+    def read_byte(self, address):
+        return self._submit(_Transaction("read_byte", address))
+
+    def close(self):
+        with self._cond:
+            if self._bus is not None:
+                self._bus.close()
+                self._bus = None
+
+    def _submit(self, txn):
+        return self.wait(self._enqueue(txn))
+
+    def _enqueue(self, txn):
+        priority = _priority.get()
+        with self._cond:
+            self._supersede(txn)
+            merged = self._merge(priority, txn)
+            if merged is None:
+                heapq.heappush(self._queue, (priority, next(self._seq), txn))
+                return txn
+            return merged
+
+    def _execute_until(self, txn):
+        """Run queued transactions in priority order until `txn` is done. Called with the lock held."""
+        self._executing = True
+        try:
+            if self._bus is None:
+                self._bus = smbus.SMBus(self._bus_number)
+            bus = self._bus
+            while not txn.done:
+                _, _, item = heapq.heappop(self._queue)
+                self._cond.release()
+                try:
+                    start = time.perf_counter()
+                    item.run(bus)
+                    self._record(item, time.perf_counter() - start)
+                finally:
+                    self._cond.acquire()
+                item.done = True
+                self.transactions += 1
+                self._cond.notify_all()
+        finally:
+            self._executing = False
+            self._cond.notify_all()
+
+    def _record(self, txn, seconds):
+        if not metrics.enabled:
+            return
+        names = self._metric_names.get(txn.address)
+        if names is None:
+            device = f"i2c.0x{txn.address:02x}"
+            names = self._metric_names[txn.address] = (device, f"{device}.transactions", f"{device}.bytes")
+        device, transactions, size = names
+        metrics.count(transactions)
+        metrics.count(size, txn.size)
+        metrics.observe(device, seconds)
+        if txn.error is not None:
+            metrics.count(f"{device}.errors")
+
+    def _supersede(self, txn):
+        """Overwrite the bytes `txn` shares with older pending writes to the same device, at any priority."""
+        if txn.address not in self._auto_increment or txn.op not in ("write_byte_data", "write_i2c_block_data"):
+            return
+        start, end = txn.register, txn.register + len(txn.data)
+        for _, _, queued in self._queue:
+            if queued.address != txn.address or queued.op not in ("write_byte_data", "write_i2c_block_data"):
+                continue
+            queued_start = queued.register
+            for register in range(max(start, queued_start), min(end, queued_start + len(queued.data))):
+                queued.data[register - queued_start] = txn.data[register - start]
+
+    def _merge(self, priority, txn):
+        """Fold a register write into an adjacent pending write to the same device, if there is one."""
+        if txn.address not in self._auto_increment or txn.op not in ("write_byte_data", "write_i2c_block_data"):
+            return None
+        start, end = txn.register, txn.register + len(txn.data)
+        # Only the most recent pending write to the device may absorb this one, so writes stay in order
+        candidates = [
+            (seq, queued)
+            for queued_priority, seq, queued in self._queue
+            if queued_priority == priority and queued.address == txn.address
+        ]
+        if not candidates:
+            return None
+        _, queued = max(candidates, key=lambda candidate: candidate[0])
+        if queued.op not in ("write_byte_data", "write_i2c_block_data"):
+            return None
+        queued_start, queued_end = queued.register, queued.register + len(queued.data)
+        if start > queued_end or end < queued_start:
+            return None
+        merged_start, merged_end = min(start, queued_start), max(end, queued_end)
+        if merged_end - merged_start > self.__BLOCK_MAX:
+            return None
+        data = [0] * (merged_end - merged_start)
+        data[queued_start - merged_start:queued_end - merged_start] = queued.data
+        data[start - merged_start:end - merged_start] = txn.data
+        queued.register = merged_start
+        queued.data = data
+        queued.op = "write_i2c_block_data" if len(data) > 1 else "write_byte_data"
+        self.merged += 1
+        return queued
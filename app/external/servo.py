@@ -2,30 +2,54 @@ from app.external.PCA9685 import PCA9685
 
 
 class Servo:
-    def __init__(self):
-        self.PwmServo = PCA9685(0x40, debug=True)
+    CHANNELS = ('0', '1', '2', '3', '4', '5', '6', '7')
+    ERROR = 10
+
+    def __init__(self, pwm=None):
+        self.PwmServo = pwm if pwm else PCA9685(0x40, debug=True)
         self.PwmServo.setPWMFreq(50)
-        self.PwmServo.setServoPulse(8, 1500)
-        self.PwmServo.setServoPulse(9, 1500)
+        self.PwmServo.setServoPulses({8: 1500, 9: 1500})
+        # Per-channel angle (0-180) -> PCA9685 OFF tick lookup for the default error offset
+        self.ticks = {channel: self.tick_table(channel) for channel in self.CHANNELS}
 
-    def setServoPwm(self, channel, angle, error=10):
+    @staticmethod
+    def servo_pulse(channel, angle, error=ERROR):
+        """PCA9685 channel and pulse width (us) for a servo channel '0'-'7' at `angle`"""
         angle = int(angle)
         if channel == '0':
-            self.PwmServo.setServoPulse(8, 2500 - int((angle + error) / 0.09))
-        elif channel == '1':
-            self.PwmServo.setServoPulse(9, 500 + int((angle + error) / 0.09))
-        elif channel == '2':
-            self.PwmServo.setServoPulse(10, 500 + int((angle + error) / 0.09))
-        elif channel == '3':
-            self.PwmServo.setServoPulse(11, 500 + int((angle + error) / 0.09))
-        elif channel == '4':
-            self.PwmServo.setServoPulse(12, 500 + int((angle + error) / 0.09))
-        elif channel == '5':
-            self.PwmServo.setServoPulse(13, 500 + int((angle + error) / 0.09))
-        elif channel == '6':
-            self.PwmServo.setServoPulse(14, 500 + int((angle + error) / 0.09))
-        elif channel == '7':
-            self.PwmServo.setServoPulse(15, 500 + int((angle + error) / 0.09))
+            return 8, 2500 - int((angle + error) / 0.09)
+        elif channel in ('1', '2', '3', '4', '5', '6', '7'):
+            return 8 + int(channel), 500 + int((angle + error) / 0.09)
+        return None
+
+    @classmethod
+    def tick_table(cls, channel, error=ERROR):
+        """PCA9685 channel and the OFF tick for every whole angle 0-180"""
+        pwm_channel = cls.servo_pulse(channel, 0, error)[0]
+        return pwm_channel, [int(cls.servo_pulse(channel, angle, error)[1] * 4096 / 20000) for angle in range(181)]
+
+    def servo_tick(self, channel, angle, error=ERROR):
+        """PCA9685 channel and OFF tick for a servo channel at `angle`, or None for an unknown channel"""
+        angle = int(angle)
+        if error == self.ERROR and channel in self.ticks and 0 <= angle <= 180:
+            pwm_channel, table = self.ticks[channel]
+            return pwm_channel, table[angle]
+        pulse = self.servo_pulse(channel, angle, error)
+        if pulse is None:
+            return None
+        return pulse[0], int(pulse[1] * 4096 / 20000)
+
+    def setServoPwm(self, channel, angle, error=ERROR):
+        self.setServoPwms({channel: angle}, error)
+
+    def setServoPwms(self, angles, error=ERROR):
+        """Sets several servos in one PCA9685 frame, `angles` maps channel -> angle"""
+        frame = {}
+        for channel, angle in angles.items():
+            tick = self.servo_tick(channel, angle, error)
+            if tick is not None:
+                frame[tick[0]] = (0, tick[1])
+        self.PwmServo.setPWMFrame(frame)
 
 
 # Main program logic follows:
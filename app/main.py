@@ -1,3 +1,4 @@
+import json
 import threading
 import time
 from threading import Thread
@@ -5,32 +6,53 @@ import logging
 from typing import Optional
 
 import numpy as np
-import cv2
 
 from make87_messages.core.empty_pb2 import Empty
 from make87_messages.core.header_pb2 import Header
+from make87_messages.primitive.bool_pb2 import Bool
+from make87_messages.text.text_plain_pb2 import PlainText
 from make87_messages.tensor.vector_2_pb2 import Vector2
 from make87_messages.tensor.vector_3_pb2 import Vector3
 from make87_messages.image.compressed.image_jpeg_pb2 import ImageJPEG
 
 import make87
+from app.camera import CameraPipeline, FrameRing, LazyEncoder, MotionGate
+from app.drive import DriveScheduler, wheel_speeds
 from app.external.Motor import Motor
+from app.external.bus import BusManager
 from app.external.servo import Servo
+from app.metrics import metrics
+from app.servo_control import ServoController
+from app.telemetry import LEFT_LIGHT_CHANNEL, RIGHT_LIGHT_CHANNEL, TelemetrySampler
 
 
 class Vehicle:
-    def __init__(self, servo: Optional[Servo] = None, motor: Optional[Motor] = None):
-        pass
-        self.motor = motor if motor else Motor()
-        self.camera_servo = servo if servo else Servo()
+    def __init__(
+        self, servo: Optional[Servo] = None, motor: Optional[Motor] = None, bus: Optional[BusManager] = None
+    ):
+        # One manager owns the I2C bus; motor and camera servos share its PCA9685
+        self.bus = bus if bus else BusManager()
+        self.motor = motor if motor else Motor(pwm=self.bus.pca9685(0x40), adc=self.bus.adc())
+        self.drive = DriveScheduler(self.motor)
+        self.drive.start()
+        self.setpoint_timeout = 0.25
+        self.setpoint_accel = 4000.0
+        self.camera_servo = servo if servo else Servo(pwm=self.bus.pca9685(0x40))
         self.last_image_lock = threading.Lock()
         self.last_image = None
+        self.camera_pipeline: Optional[CameraPipeline] = None
+        self.frame_ring: Optional[FrameRing] = None
+        self.frame_encoder: Optional[LazyEncoder[ImageJPEG]] = None
+        # Set once raw frames are needed in stream mode, i.e. after the first variant request
+        self.keep_raw_frames = threading.Event()
+        self.telemetry: Optional[TelemetrySampler] = None
 
         # Initial camera angles
         self.pitch = 135.0  # midway between 111 and 159
         self.yaw = 75.0  # midway between 1 and 149
-        self.camera_servo.setServoPwm("1", self.pitch)
-        self.camera_servo.setServoPwm("0", self.yaw)
+        self.servo_control = ServoController(self.camera_servo, {"0": self.yaw, "1": self.pitch})
+        self.servo_control.flush()
+        self.servo_control.start()
 
     @staticmethod
     def compute_wheel_speeds(x: float, y: float, max_speed=1000):
@@ -39,40 +61,26 @@ class Vehicle:
         Positive x → right turn (left wheel faster)
         Positive y → forward
         """
-        # Clamp vector magnitude to 1 (optional safety)
-        vector = np.array([x, y])
-        mag = np.linalg.norm(vector)
-        if mag > 1:
-            vector /= mag
-
-        turn = vector[0]  # right is positive
-        speed = vector[1]  # forward
-
-        # Corrected mixing:
-        left = speed + turn  # Right turn: left wheel goes faster
-        right = speed - turn  # Right turn: right wheel slows down
-
-        # Normalize if needed to avoid exceeding [-1, 1]
-        max_val = max(abs(left), abs(right))
-        if max_val > 1:
-            left /= max_val
-            right /= max_val
-
-        return int(left * max_speed), int(right * max_speed)
+        return wheel_speeds(x, y, max_speed)
 
     def handle_drive_instruction(self, message: Vector3) -> Empty:
+        # x/y = direction, z = duration in seconds; the scheduler stops the motors
+        # once it elapses unless a newer command arrives first
         left_motor, right_motor = self.compute_wheel_speeds(message.x, message.y)
+        self.drive.submit(left_motor, right_motor, message.z)
+        return Empty()
 
-        self.motor.setMotorModel(
-            front_left=left_motor,
-            rear_left=left_motor,
-            front_right=right_motor,
-            rear_right=right_motor,
-        )
+    def handle_drive_setpoint(self, message: Vector3):
+        # x/y = direction as for SET_DRIVE_DIRECTION, z is ignored. Each setpoint
+        # keeps the car moving for setpoint_timeout seconds; when the stream goes
+        # quiet the scheduler ramps the motors down to a stop.
+        left_motor, right_motor = self.compute_wheel_speeds(message.x, message.y)
+        self.drive.submit(left_motor, right_motor, self.setpoint_timeout, accel=self.setpoint_accel or None)
+        metrics.count("drive.setpoints")
 
-        time.sleep(max(0.0, message.z))
-        self.motor.setMotorModel(front_left=0, rear_left=0, front_right=0, rear_right=0)
-        return Empty()
+    def is_moving(self) -> bool:
+        """Whether the wheels are turning or the camera servos are still moving."""
+        return self.drive.speeds != (0, 0) or self.servo_control.moving
 
     def handle_set_camera_direction(self, delta: Vector2) -> Empty:
         # x = yaw delta (clockwise = right)
@@ -81,34 +89,78 @@ class Vehicle:
         self.yaw = max(1.0, min(149.0, self.yaw + delta.x))
         self.pitch = max(111.0, min(159.0, self.pitch + delta.y))
 
-        self.camera_servo.setServoPwm("0", self.yaw)
-        self.camera_servo.setServoPwm("1", self.pitch)
+        # The servo controller writes the new angles on its next update
+        self.servo_control.set_targets({"0": self.yaw, "1": self.pitch})
 
         return Empty()
 
     def handle_get_latest_camera_image(self, request: Empty) -> ImageJPEG:
-        # This method is not implemented in the original code
-        # You can implement it if needed
-        img_msg = None
         with self.last_image_lock:
-            if self.last_image is not None:
-                img_msg = self.last_image
-            else:
-                header = make87.create_header(Header, entity_path="/picamera")
-                img_msg = ImageJPEG(data=b"", header=header)
+            img_msg = self.last_image
+        # In on-demand mode nothing is published; encode the latest frame lazily
+        if img_msg is None and self.frame_encoder is not None:
+            img_msg = self.frame_encoder.get()
+        if img_msg is None:
+            header = make87.create_header(Header, entity_path="/picamera")
+            img_msg = ImageJPEG(data=b"", header=header)
+
+        return img_msg
+
+    def handle_get_camera_image_variant(self, request: Vector2) -> ImageJPEG:
+        # x = JPEG quality, clamped to 1-100 (0 = configured default)
+        # y = downscale factor in (0, 1] (anything else = full resolution)
+        img_msg = None
+        if self.frame_encoder is not None:
+            self.keep_raw_frames.set()
+            if self.frame_ring.latest_id is None:
+                self.frame_ring.wait(timeout=1.0)
+            img_msg = self.frame_encoder.get(quality=request.x, scale=request.y)
+        if img_msg is None:
+            header = make87.create_header(Header, entity_path="/picamera")
+            img_msg = ImageJPEG(data=b"", header=header)
 
         return img_msg
 
+    @staticmethod
+    def _image_message(frame_id: int, data: bytes) -> ImageJPEG:
+        header = make87.create_header(Header, entity_path="/picamera")
+        return ImageJPEG(data=data, header=header)
+
     def publish_camera_image(self):
 
         from picamera2.picamera2 import Picamera2
 
         topic = make87.get_publisher(name="IMAGE", message_type=ImageJPEG)
+        width = make87.get_config_value("CAMERA_WIDTH", 640)
+        height = make87.get_config_value("CAMERA_HEIGHT", 480)
+        fps = make87.get_config_value("CAMERA_FPS", 0.0)
+        quality = make87.get_config_value("JPEG_QUALITY", 95)
+        encoders = make87.get_config_value("JPEG_ENCODER_THREADS", 2)
+        mode = make87.get_config_value("CAMERA_MODE", "stream")
+        ring_size = make87.get_config_value("CAMERA_RING_SIZE", 4)
+
+        gate = None
+        if mode == "adaptive":
+            idle_scale = make87.get_config_value("CAMERA_IDLE_SCALE", 1.0)
+            if not 0 < idle_scale <= 1:
+                logging.error(f"Ignoring CAMERA_IDLE_SCALE={idle_scale}, it must be in (0, 1]")
+                idle_scale = 1.0
+            gate = MotionGate(
+                active=self.is_moving,
+                quality=quality,
+                idle_quality=make87.get_config_value("CAMERA_IDLE_QUALITY", 70),
+                idle_scale=idle_scale,
+                idle_fps=make87.get_config_value("CAMERA_IDLE_FPS", 5.0),
+                change_threshold=make87.get_config_value("CAMERA_CHANGE_THRESHOLD", 12),
+                motion_threshold=make87.get_config_value("CAMERA_MOTION_THRESHOLD", 0.01),
+                keyframe_interval=make87.get_config_value("CAMERA_KEYFRAME_INTERVAL", 5.0),
+            )
 
         try:
             picam2 = Picamera2()
+            controls = {"FrameRate": fps} if fps > 0 else {}
             video_config = picam2.create_video_configuration(
-                main={"size": (640, 480), "format": "RGB888"}
+                main={"size": (width, height), "format": "RGB888"}, controls=controls
             )
             picam2.configure(video_config)
             picam2.start()
@@ -116,49 +168,163 @@ class Vehicle:
             logging.error(f"Cannot initialize camera: {e}")
             return
 
+        self.frame_ring = FrameRing(ring_size)
+        self.frame_encoder = LazyEncoder(self.frame_ring, self._image_message, quality=quality)
+
+        if mode == "on_demand":
+            self.keep_raw_frames.set()
+            self.capture_to_ring(picam2)
+            picam2.stop()
+            return
+
+        def capture() -> np.ndarray:
+            frame = picam2.capture_array()
+            # Copying every frame into the ring only pays off once variants are requested
+            if self.keep_raw_frames.is_set():
+                self.frame_ring.push(frame)
+            return frame
+
+        def publish(frame_id: int, captured_at: float, data: bytes):
+            message = self._image_message(frame_id, data)
+            with self.last_image_lock:
+                self.last_image = message
+            topic.publish(message)
+
+        self.camera_pipeline = CameraPipeline(
+            capture=capture,
+            sink=publish,
+            encoders=encoders,
+            quality=quality,
+            fps=fps,
+            gate=gate,
+        )
+        self.camera_pipeline.start()
+        self.camera_pipeline.join()
+
+        picam2.stop()
+
+    def capture_to_ring(self, picam2):
+        """Copy frames straight from the camera buffers into the ring, encoding nothing."""
+        from picamera2 import MappedArray
+
         while True:
             try:
-                frame = picam2.capture_array()
-                ret, frame_jpeg = cv2.imencode(".jpeg", frame)
-                if not ret:
-                    logging.error("Error: Could not encode frame to JPEG.")
-                    break
-                frame_jpeg_bytes = frame_jpeg.tobytes()
-                header = make87.create_header(Header, entity_path="/picamera")
-                message = ImageJPEG(data=frame_jpeg_bytes, header=header)
-                with self.last_image_lock:
-                    self.last_image = message
-                topic.publish(message)
+                request = picam2.capture_request()
+                try:
+                    with MappedArray(request, "main") as mapped:
+                        self.frame_ring.push(mapped.array)
+                    metrics.count("camera.frames_captured")
+                finally:
+                    request.release()
             except Exception as e:
-                logging.error(f"Error while capturing or publishing image: {e}")
+                logging.error(f"Error while capturing image: {e}")
                 break
 
-        picam2.stop()
+    def handle_get_metrics(self, request: Bool) -> PlainText:
+        # value = reset the counters and histograms after taking the snapshot
+        header = make87.create_header(Header, entity_path="/metrics")
+        return PlainText(header=header, body=json.dumps(metrics.snapshot(reset=request.value)))
+
+    def publish_metrics(self, interval: float):
+        topic = make87.get_publisher(name="METRICS", message_type=PlainText)
+        while True:
+            time.sleep(interval)
+            try:
+                header = make87.create_header(Header, entity_path="/metrics")
+                topic.publish(PlainText(header=header, body=json.dumps(metrics.snapshot())))
+            except Exception as e:
+                logging.error(f"Error while publishing metrics: {e}")
+
+    def start_telemetry(self):
+        rate = make87.get_config_value("TELEMETRY_RATE", 2.0)
+        if rate <= 0:
+            return
+
+        topic = make87.get_publisher(name="TELEMETRY", message_type=Vector3)
+
+        def publish(values):
+            # x/y = left/right photoresistor voltage, z = battery voltage
+            header = make87.create_header(Header, entity_path="/telemetry")
+            message = Vector3(
+                header=header,
+                x=values.get(LEFT_LIGHT_CHANNEL, 0.0),
+                y=values.get(RIGHT_LIGHT_CHANNEL, 0.0),
+                z=self.telemetry.battery_voltage() or 0.0,
+            )
+            topic.publish(message)
+
+        self.telemetry = TelemetrySampler(
+            self.bus.adc(),
+            rate=rate,
+            window=make87.get_config_value("TELEMETRY_WINDOW", 5),
+            alpha=make87.get_config_value("TELEMETRY_EMA_ALPHA", 0.3),
+            publish=publish,
+        )
+        self.motor.telemetry = self.telemetry
+        self.telemetry.start()
+
+    def configure(self):
+        servo_rate = make87.get_config_value("SERVO_UPDATE_RATE", 50.0)
+        if servo_rate > 0:
+            self.servo_control.rate = servo_rate
+        else:
+            logging.error(f"Ignoring SERVO_UPDATE_RATE={servo_rate}, it must be positive")
+        self.servo_control.slew = make87.get_config_value("SERVO_SLEW_RATE", 0.0)
+
+        self.setpoint_timeout = make87.get_config_value("DRIVE_SETPOINT_TIMEOUT", self.setpoint_timeout)
+        self.setpoint_accel = make87.get_config_value("DRIVE_ACCELERATION", self.setpoint_accel)
 
     def run(self):
+        self.configure()
+
         camera_thread = Thread(target=self.publish_camera_image)
         camera_thread.start()
 
+        self.start_telemetry()
+
+        metrics_interval = make87.get_config_value("METRICS_INTERVAL", 10.0)
+        if metrics.enabled and metrics_interval > 0:
+            Thread(target=self.publish_metrics, args=(metrics_interval,), daemon=True).start()
+
         drive_endpoint = make87.get_provider(
             name="SET_DRIVE_DIRECTION",
             requester_message_type=Vector3,
             provider_message_type=Empty,
         )
-        drive_endpoint.provide(self.handle_drive_instruction)
+        drive_endpoint.provide(metrics.timed("endpoint.SET_DRIVE_DIRECTION", self.handle_drive_instruction))
+
+        drive_setpoint_topic = make87.get_subscriber(name="DRIVE_SETPOINT", message_type=Vector3)
+        drive_setpoint_topic.subscribe(self.handle_drive_setpoint)
 
         camera_direction_endpoint = make87.get_provider(
             name="SET_CAMERA_DIRECTION",
             requester_message_type=Vector2,
             provider_message_type=Empty,
         )
-        camera_direction_endpoint.provide(self.handle_set_camera_direction)
+        camera_direction_endpoint.provide(metrics.timed("endpoint.SET_CAMERA_DIRECTION", self.handle_set_camera_direction))
 
         camera_image_endpoint = make87.get_provider(
             name="GET_CAMERA_IMAGE",
             requester_message_type=Empty,
             provider_message_type=ImageJPEG,
         )
-        camera_image_endpoint.provide(self.handle_get_latest_camera_image)
+        camera_image_endpoint.provide(metrics.timed("endpoint.GET_CAMERA_IMAGE", self.handle_get_latest_camera_image))
+
+        camera_image_variant_endpoint = make87.get_provider(
+            name="GET_CAMERA_IMAGE_VARIANT",
+            requester_message_type=Vector2,
+            provider_message_type=ImageJPEG,
+        )
+        camera_image_variant_endpoint.provide(
+            metrics.timed("endpoint.GET_CAMERA_IMAGE_VARIANT", self.handle_get_camera_image_variant)
+        )
+
+        metrics_endpoint = make87.get_provider(
+            name="GET_METRICS",
+            requester_message_type=Bool,
+            provider_message_type=PlainText,
+        )
+        metrics_endpoint.provide(self.handle_get_metrics)
 
         # angle = max(50.0, min(110.0, 70))
         # self.camera_servo.setServoPwm("1", -180)
@@ -170,6 +336,9 @@ class Vehicle:
 
 def main():
     make87.initialize()
+    metrics.enabled = make87.get_config_value(
+        "METRICS_ENABLED", True, decode=lambda value: str(value).lower() in ("1", "true", "yes")
+    )
     vehicle = Vehicle()
     vehicle.run()
 
@@ -0,0 +1,135 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+# Latency histogram bucket upper bounds in seconds, 50us .. 5s
+BUCKETS = [
+    50e-6, 100e-6, 200e-6, 500e-6,
+    1e-3, 2e-3, 5e-3, 10e-3, 20e-3, 50e-3,
+    100e-3, 200e-3, 500e-3, 1.0, 2.0, 5.0,
+]
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Upper bucket bound below which a fraction `q` of the observations fall."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + [self.max], self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, float]:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1e3,
+            "min_ms": self.min * 1e3,
+            "p50_ms": self.quantile(0.5) * 1e3,
+            "p95_ms": self.quantile(0.95) * 1e3,
+            "max_ms": self.max * 1e3,
+        }
+
+
+class Metrics:
+    """Process-wide counters and latency histograms.
+
+    Recording is a dict lookup and a few additions under a lock; with
+    `enabled` off every recording call returns immediately.
+    """
+
+    def __init__(self, enabled: bool = True, clock: Callable[[], float] = time.monotonic):
+        self.enabled = enabled
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._since = clock()
+
+    def count(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def _timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timer(self, name: str):
+        """Context manager recording the duration of its block under `name`."""
+        if not self.enabled:
+            return nullcontext()
+        return self._timer(name)
+
+    def timed(self, name: str, fn: Callable[..., T]) -> Callable[..., T]:
+        """Wrap `fn` so every call records its duration under `name`."""
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return fn(*args, **kwargs)
+            with self._timer(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    def snapshot(self, reset: bool = False) -> Dict[str, Dict]:
+        """Counters (with their rate per second) and histogram summaries since the last reset."""
+        now = self.clock()
+        with self._lock:
+            elapsed = max(now - self._since, 1e-9)
+            counters = {
+                name: {"value": value, "rate_per_s": value / elapsed} for name, value in sorted(self._counters.items())
+            }
+            histograms = {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())}
+            if reset:
+                self._counters = {}
+                self._histograms = {}
+                self._since = now
+        return {"interval_s": elapsed, "counters": counters, "latency": histograms}
+
+    def reset(self):
+        self.snapshot(reset=True)
+
+
+metrics = Metrics()
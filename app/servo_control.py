@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from app.external.bus import SERVO, bus_priority
+from app.external.servo import Servo
+
+
+class ServoController:
+    """Pushes servo targets to the hardware at a fixed rate from a background thread.
+
+    Callers only set targets; the latest target per channel wins. Each update
+    period the controller moves towards the targets, optionally limited to
+    `slew` degrees per second, and writes all channels whose whole-degree angle
+    (and hence PWM tick) changed in one PCA9685 frame.
+    """
+
+    def __init__(self, servo: Servo, targets: Dict[str, float], rate: float = 50.0, slew: float = 0.0):
+        self.servo = servo
+        self.rate = rate
+        self.slew = slew
+        self._targets = dict(targets)
+        self._current: Dict[str, float] = {}
+        self._sent: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.writes = 0
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="servo-controller", daemon=True)
+        self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def set_targets(self, targets: Dict[str, float]):
+        with self._lock:
+            self._targets.update(targets)
+        self._wake.set()
+
+    def targets(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._targets)
+
+    @property
+    def moving(self) -> bool:
+        """Whether any channel has not reached its target yet."""
+        return any(self._current.get(channel) != target for channel, target in self.targets().items())
+
+    def flush(self):
+        """Move straight to the current targets and write them, ignoring the slew limit."""
+        with self._write_lock:
+            targets = self.targets()
+            self._current.update(targets)
+            self._write(targets)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            if self._stop.is_set():
+                return
+            self._wake.clear()
+            period = 1.0 / self.rate
+            start = time.monotonic()
+            try:
+                if self._step(period):
+                    self._wake.set()
+            except Exception as e:
+                logging.error(f"Error while setting servo angles: {e}")
+            self._stop.wait(max(0.0, period - (time.monotonic() - start)))
+
+    def _step(self, dt: float) -> bool:
+        """Advance one period towards the targets; returns whether any channel is still moving."""
+        with self._write_lock:
+            targets = self.targets()
+            moving = False
+            for channel, target in targets.items():
+                current = self._current.get(channel, target)
+                if self.slew > 0:
+                    max_step = self.slew * dt
+                    current += max(-max_step, min(max_step, target - current))
+                else:
+                    current = target
+                self._current[channel] = current
+                moving = moving or current != target
+            self._write(self._current)
+            return moving
+
+    def _write(self, angles: Dict[str, float]):
+        changed = {channel: angle for channel, angle in angles.items() if int(angle) != self._sent.get(channel)}
+        if not changed:
+            return
+        with bus_priority(SERVO):
+            self.servo.setServoPwms(changed)
+        self.writes += 1
+        self._sent.update({channel: int(angle) for channel, angle in changed.items()})
@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+from app.external.ADC import Adc
+from app.external.bus import ADC, bus_priority
+
+LEFT_LIGHT_CHANNEL = 0
+RIGHT_LIGHT_CHANNEL = 1
+BATTERY_CHANNEL = 2
+BATTERY_DIVIDER = 3  # the battery is measured through a 1/3 voltage divider
+
+
+class TelemetrySampler:
+    """Polls ADC channels on a background thread and filters the readings.
+
+    Each channel keeps its last `window` raw samples in a fixed-size ring; the
+    filtered value is an exponential moving average over the ring's median.
+    Callers read the latest filtered value without touching the bus.
+    """
+
+    def __init__(
+        self,
+        adc: Adc,
+        rate: float = 2.0,
+        window: int = 5,
+        alpha: float = 0.3,
+        channels: Sequence[int] = (LEFT_LIGHT_CHANNEL, RIGHT_LIGHT_CHANNEL, BATTERY_CHANNEL),
+        publish: Optional[Callable[[Dict[int, float]], None]] = None,
+    ):
+        self.adc = adc
+        self.rate = rate
+        self.alpha = alpha
+        self.channels = list(channels)
+        self.publish = publish
+        self._samples = np.full((len(self.channels), max(1, window)), np.nan)
+        self._position = 0
+        self._filtered: Dict[int, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.errors = 0
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="telemetry-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def latest(self, channel: int) -> Optional[float]:
+        """Latest filtered voltage of `channel`, or None before the first sample."""
+        return self._filtered.get(channel)
+
+    def battery_voltage(self) -> Optional[float]:
+        voltage = self.latest(BATTERY_CHANNEL)
+        return voltage * BATTERY_DIVIDER if voltage is not None else None
+
+    def sample(self):
+        """Take one sample of every channel and update the filtered values."""
+        column = self._position % self._samples.shape[1]
+        for row, channel in enumerate(self.channels):
+            try:
+                with bus_priority(ADC):
+                    self._samples[row, column] = self.adc.sampleADC(channel)
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Error while reading ADC channel {channel}: {e}")
+                self._samples[row, column] = np.nan
+        self._position += 1
+
+        filtered = dict(self._filtered)
+        for row, channel in enumerate(self.channels):
+            window = self._samples[row]
+            if np.isnan(window).all():
+                continue
+            median = float(np.nanmedian(window))
+            previous = filtered.get(channel)
+            filtered[channel] = median if previous is None else previous + self.alpha * (median - previous)
+        # Swap in a new dict so readers never see a partial update
+        self._filtered = filtered
+        return filtered
+
+    def _run(self):
+        period = 1.0 / self.rate
+        next_sample = time.monotonic()
+        while not self._stop.is_set():
+            filtered = self.sample()
+            if self.publish is not None and filtered:
+                try:
+                    self.publish(filtered)
+                except Exception as e:
+                    logging.error(f"Error while publishing telemetry: {e}")
+            next_sample = max(next_sample + period, time.monotonic())
+            self._stop.wait(next_sample - time.monotonic())
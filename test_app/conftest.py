@@ -0,0 +1,58 @@
+import statistics
+import time
+
+import pytest
+
+_results = []
+
+
+class Bench:
+    """Runs a callable repeatedly and records wall time and I2C traffic per call."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, fn, rounds=200, bus=None, setup=None):
+        times = []
+        transactions = []
+        nbytes = []
+        for _ in range(rounds):
+            if setup is not None:
+                setup()
+            if bus is not None:
+                bus.reset()
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+            if bus is not None:
+                transactions.append(len(bus.transactions))
+                nbytes.append(bus.bytes)
+        stats = {
+            "mean_us": statistics.mean(times) * 1e6,
+            "p95_us": sorted(times)[int(0.95 * (len(times) - 1))] * 1e6,
+        }
+        if bus is not None:
+            stats["i2c_tx"] = max(transactions)
+            stats["i2c_bytes"] = max(nbytes)
+        self.record(**stats)
+        return stats
+
+    def record(self, **metrics):
+        _results.append((self.name, metrics))
+
+
+@pytest.fixture
+def bench(request):
+    return Bench(request.node.name)
+
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    terminalreporter.section("benchmarks")
+    for name, metrics in _results:
+        values = "  ".join(
+            f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}" for key, value in metrics.items()
+        )
+        terminalreporter.write_line(f"{name:<45} {values}")
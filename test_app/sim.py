@@ -0,0 +1,268 @@
+"""In-process stand-ins for the car's hardware.
+
+`SimBus` models the PCA9685 PWM driver and the ADS7830/PCF8591 ADC behind an
+SMBus-compatible interface, with a configurable per-transaction latency and a
+log of every transaction. `FakePicamera2` produces synthetic frames and can be
+installed in place of the `picamera2` package with `picamera2_modules`;
+`FakeMake87` stands in for the make87 runtime calls the app makes.
+"""
+
+import threading
+import time
+from types import ModuleType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class Transaction(NamedTuple):
+    op: str
+    address: int
+    register: Optional[int]
+    data: Tuple[int, ...]
+
+    @property
+    def bytes(self) -> int:
+        # address byte + register byte + payload
+        return 1 + (self.register is not None) + len(self.data)
+
+
+class SimPCA9685:
+    MODE1 = 0x00
+    MODE1_AI = 0x20
+    LED0_ON_L = 0x06
+
+    def __init__(self):
+        self.registers = [0] * 256
+
+    def write(self, register: int, data: Sequence[int]):
+        auto_increment = self.registers[self.MODE1] & self.MODE1_AI
+        for offset, value in enumerate(data):
+            # Without auto-increment every byte lands on the same register
+            self.registers[(register + offset) & 0xFF if auto_increment else register] = value & 0xFF
+
+    def read(self, register: Optional[int]) -> int:
+        return self.registers[register or 0]
+
+    def channel(self, channel: int) -> Tuple[int, int]:
+        """(on, off) counts of a PWM channel."""
+        regs = self.registers[self.LED0_ON_L + 4 * channel:self.LED0_ON_L + 4 * channel + 4]
+        return regs[0] | regs[1] << 8, regs[2] | regs[3] << 8
+
+
+class SimADC:
+    """ADS7830 or PCF8591 with fixed 8-bit channel readings plus optional noise."""
+
+    # ADS7830 command bits 6-4 -> single-ended channel
+    ADS7830_CHANNELS = {((ch << 2) | (ch >> 1)) & 0x07: ch for ch in range(8)}
+
+    def __init__(self, chip: str = "ADS7830", values: Optional[Sequence[int]] = None, noise: int = 0, seed: int = 0):
+        self.chip = chip
+        self.values = list(values) if values is not None else [128, 128, 170, 0, 0, 0, 0, 255]
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.command = 0x84
+
+    def write(self, register: Optional[int], data: Sequence[int]):
+        self.command = register if register is not None else data[0]
+
+    def read(self, register: Optional[int]) -> int:
+        if register is not None:
+            self.command = register
+        if self.chip == "ADS7830":
+            channel = self.ADS7830_CHANNELS[(self.command >> 4) & 0x07]
+        else:
+            channel = self.command & 0x03
+        value = self.values[channel]
+        if self.noise:
+            value += int(self.rng.integers(-self.noise, self.noise + 1))
+        return max(0, min(255, value))
+
+
+class SimBus:
+    """SMBus-compatible bus with simulated devices, latency and a transaction log."""
+
+    def __init__(self, latency: float = 0.0, devices: Optional[Dict[int, object]] = None):
+        self.latency = latency
+        self.devices = devices if devices is not None else {0x40: SimPCA9685(), 0x48: SimADC()}
+        self.transactions: List[Transaction] = []
+        self._cond = threading.Condition()
+
+    def _transact(self, op: str, address: int, register: Optional[int], data: Sequence[int]):
+        if self.latency:
+            # Sleep rather than spin: a real SMBus ioctl releases the GIL while the bus is busy
+            time.sleep(self.latency)
+        with self._cond:
+            self.transactions.append(Transaction(op, address, register, tuple(data)))
+            self._cond.notify_all()
+        return self.devices[address]
+
+    def write_byte_data(self, address, register, value):
+        self._transact("write_byte_data", address, register, [value]).write(register, [value])
+
+    def write_i2c_block_data(self, address, register, data):
+        if len(data) > 32:
+            raise ValueError("Data length cannot exceed 32 bytes")
+        self._transact("write_i2c_block_data", address, register, data).write(register, data)
+
+    def write_byte(self, address, value):
+        self._transact("write_byte", address, None, [value]).write(None, [value])
+
+    def read_byte_data(self, address, register):
+        return self._transact("read_byte_data", address, register, []).read(register)
+
+    def read_byte(self, address):
+        return self._transact("read_byte", address, None, []).read(None)
+
+    def close(self):
+        pass
+
+    def reset(self):
+        with self._cond:
+            self.transactions.clear()
+
+    @property
+    def bytes(self) -> int:
+        return sum(t.bytes for t in self.transactions)
+
+    def wait_for(self, predicate: Callable[["SimBus"], bool], timeout: float = 1.0) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: predicate(self), timeout)
+
+
+class FakeRequest:
+    """Capture request holding a view of the camera's frame buffer until released."""
+
+    def __init__(self, frame: np.ndarray):
+        self.frame = frame
+
+    def make_array(self, name: str) -> np.ndarray:
+        return self.frame.copy()
+
+    def release(self):
+        pass
+
+
+class FakePicamera2:
+    """Picamera2 stand-in that renders a moving gradient at a given sensor frame rate."""
+
+    def __init__(self, fps: float = 0.0):
+        self.size = (640, 480)
+        self.fps = fps
+        self.started = False
+        self.frames = 0
+        self._next_frame = 0.0
+        self._base: Optional[np.ndarray] = None
+        self._frame: Optional[np.ndarray] = None
+
+    def create_video_configuration(self, main=None, controls=None):
+        return {"main": main or {"size": self.size, "format": "RGB888"}, "controls": controls or {}}
+
+    def configure(self, config):
+        self.size = tuple(config["main"]["size"])
+        frame_rate = config.get("controls", {}).get("FrameRate")
+        if frame_rate:
+            self.fps = frame_rate
+
+    def start(self):
+        self.started = True
+        self._next_frame = time.monotonic()
+
+    def stop(self):
+        self.started = False
+
+    def _render(self) -> np.ndarray:
+        width, height = self.size
+        if self._frame is None:
+            x = np.linspace(0, 255, width, dtype=np.float32)
+            y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+            self._base = ((x + y) / 2).astype(np.uint8)
+            self._frame = np.empty((height, width, 3), dtype=np.uint8)
+        shift = (self.frames * 4) % width
+        self._frame[..., 0] = np.roll(self._base, shift, axis=1)
+        self._frame[..., 1] = self._base
+        self._frame[..., 2] = 255 - self._base
+        return self._frame
+
+    def _wait_for_frame(self):
+        if not self.started:
+            raise RuntimeError("Camera is not started")
+        if self.fps:
+            delay = self._next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_frame = max(self._next_frame + 1.0 / self.fps, time.monotonic())
+        self.frames += 1
+
+    def capture_array(self, name: str = "main") -> np.ndarray:
+        self._wait_for_frame()
+        return self._render().copy()
+
+    def capture_request(self) -> FakeRequest:
+        self._wait_for_frame()
+        return FakeRequest(self._render())
+
+
+class FakeMappedArray:
+    """`picamera2.MappedArray` stand-in exposing a request's buffer without copying it."""
+
+    def __init__(self, request: FakeRequest, stream: str):
+        self.request = request
+        self.array: Optional[np.ndarray] = None
+
+    def __enter__(self) -> "FakeMappedArray":
+        self.array = self.request.frame
+        return self
+
+    def __exit__(self, *exc):
+        self.array = None
+
+
+def picamera2_modules(camera: FakePicamera2) -> Dict[str, ModuleType]:
+    """`sys.modules` entries under which `Picamera2()` returns `camera`."""
+    package = ModuleType("picamera2")
+    module = ModuleType("picamera2.picamera2")
+    module.Picamera2 = package.Picamera2 = lambda *args, **kwargs: camera
+    package.MappedArray = FakeMappedArray
+    package.picamera2 = module
+    return {"picamera2": package, "picamera2.picamera2": module}
+
+
+class FakeTopic:
+    """Publisher that records every published message."""
+
+    def __init__(self):
+        self.messages: List[Any] = []
+        self._cond = threading.Condition()
+
+    def publish(self, message):
+        with self._cond:
+            self.messages.append(message)
+            self._cond.notify_all()
+
+    def wait_for(self, count: int, timeout: float = 1.0) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self.messages) >= count, timeout)
+
+
+class FakeMake87:
+    """Config values, publishers and headers for code that calls the make87 runtime."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = dict(config or {})
+        self.topics: Dict[str, FakeTopic] = {}
+
+    def get_config_value(self, name, default=None, decode=None):
+        return self.config.get(name, default)
+
+    def get_publisher(self, name, message_type):
+        return self.topics.setdefault(name, FakeTopic())
+
+    def create_header(self, header_type, entity_path=""):
+        return header_type(entity_path=entity_path)
+
+    def install(self, monkeypatch):
+        import make87
+
+        for name in ("get_config_value", "get_publisher", "create_header"):
+            monkeypatch.setattr(make87, name, getattr(self, name), raising=False)
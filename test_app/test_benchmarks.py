@@ -0,0 +1,223 @@
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+from make87_messages.tensor.vector_3_pb2 import Vector3
+
+from app.camera import CameraPipeline, MotionGate, encode_jpeg
+from app.drive import wheel_speeds, wheel_speeds_batch
+from app.external.ADC import Adc
+from app.external.Motor import Motor
+from app.external.PCA9685 import PCA9685
+from app.external.bus import ADC, BusManager, bus_priority
+from app.external.servo import Servo
+from app.main import Vehicle
+from app.metrics import metrics
+from test_app.sim import FakeMake87, FakePicamera2, SimADC, SimBus, picamera2_modules
+
+pytestmark = pytest.mark.benchmark
+
+# Typical 100 kHz bus transaction time for a short write
+BUS_LATENCY = 200e-6
+
+
+@pytest.fixture
+def bus():
+    return SimBus(latency=BUS_LATENCY)
+
+
+@pytest.fixture
+def motor(bus):
+    return Motor(pwm=PCA9685(0x40, bus=bus), adc=Adc(bus=bus))
+
+
+@pytest.fixture
+def servo(bus):
+    return Servo(pwm=PCA9685(0x40, bus=bus))
+
+
+def test_bench_set_motor_model(bench, bus, motor):
+    speeds = iter([1000, -1000] * 1000)
+
+    def drive():
+        duty = next(speeds)
+        motor.setMotorModel(duty, duty, -duty, -duty)
+
+    stats = bench(drive, rounds=100, bus=bus)
+    assert stats["i2c_tx"] <= 2
+
+
+def test_bench_set_motor_model_stop(bench, bus, motor):
+    stats = bench(
+        lambda: motor.setMotorModel(0, 0, 0, 0),
+        rounds=100,
+        bus=bus,
+        setup=lambda: motor.setMotorModel(2000, 2000, 2000, 2000),
+    )
+    assert stats["i2c_tx"] <= 2
+
+
+def test_bench_set_servo_pwm(bench, bus, servo):
+    angles = iter(list(range(10, 140)) * 10)
+    stats = bench(lambda: servo.setServoPwm("0", next(angles)), rounds=100, bus=bus)
+    assert stats["i2c_tx"] <= 1
+
+
+@pytest.mark.parametrize("chip", ["ADS7830", "PCF8591"])
+def test_bench_recv_adc(bench, chip):
+    bus = SimBus(latency=BUS_LATENCY, devices={0x48: SimADC(chip)})
+    adc = Adc(bus=bus)
+    assert adc.Index == chip
+    stats = bench(lambda: adc.recvADC(2), rounds=50, bus=bus)
+    assert adc.recvADC(2) == pytest.approx(170 / (255.0 if chip == "ADS7830" else 256.0) * 3.3, abs=0.01)
+    assert stats["i2c_tx"] <= 20
+
+
+def test_bench_drive_command_latency(bench, bus, motor, servo):
+    vehicle = Vehicle(servo=servo, motor=motor)
+    pca = bus.devices[0x40]
+    latencies = []
+    try:
+        for i in range(50):
+            speed = 1.0 if i % 2 else -1.0
+            expected = (0, 1000) if speed > 0 else (0, 0)
+            start = time.perf_counter()
+            vehicle.handle_drive_instruction(Vector3(x=0.0, y=speed, z=5.0))
+            assert bus.wait_for(lambda _: pca.channel(1) == expected)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        vehicle.drive.shutdown()
+        vehicle.servo_control.stop()
+    latencies.sort()
+    bench.record(mean_us=float(np.mean(latencies) * 1e6), p95_us=latencies[int(0.95 * (len(latencies) - 1))] * 1e6)
+    assert latencies[len(latencies) // 2] < 0.05
+
+
+def test_bench_stop_latency_under_contention(bench, bus):
+    vehicle = Vehicle(bus=BusManager(bus=bus))
+    pca = bus.devices[0x40]
+    adc = vehicle.bus.adc()
+    stop = threading.Event()
+
+    def flood_adc():
+        while not stop.is_set():
+            with bus_priority(ADC):
+                adc.sampleADC(2)
+
+    def flood_servos():
+        yaw = 0
+        while not stop.is_set():
+            yaw = (yaw + 7) % 140
+            vehicle.servo_control.set_targets({"0": float(yaw)})
+            time.sleep(0.001)
+
+    floods = [threading.Thread(target=flood_adc) for _ in range(2)] + [threading.Thread(target=flood_servos)]
+    for thread in floods:
+        thread.start()
+    latencies = []
+    try:
+        for _ in range(30):
+            vehicle.handle_drive_instruction(Vector3(x=0.0, y=1.0, z=5.0))
+            assert bus.wait_for(lambda _: pca.channel(1) == (0, 1000))
+            start = time.perf_counter()
+            vehicle.drive.halt()
+            assert bus.wait_for(lambda _: pca.channel(1) == (0, 4095))
+            latencies.append(time.perf_counter() - start)
+    finally:
+        stop.set()
+        for thread in floods:
+            thread.join()
+        vehicle.drive.shutdown()
+        vehicle.servo_control.stop()
+    latencies.sort()
+    bench.record(mean_us=float(np.mean(latencies) * 1e6), p95_us=latencies[int(0.95 * (len(latencies) - 1))] * 1e6)
+    assert latencies[len(latencies) // 2] < 0.05
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_bench_metrics_overhead(bench, enabled):
+    manager = BusManager(bus=SimBus())
+    motor = Motor(pwm=manager.pca9685(0x40), adc=manager.adc())
+    speeds = iter([1000, -1000] * 1000)
+
+    def drive():
+        duty = next(speeds)
+        motor.setMotorModel(duty, duty, -duty, -duty)
+
+    metrics.enabled = enabled
+    try:
+        bench(drive, rounds=500)
+    finally:
+        metrics.enabled = True
+        metrics.reset()
+
+
+def test_bench_wheel_speeds(bench):
+    stats = bench(lambda: wheel_speeds(0.3, 0.8), rounds=1000)
+    assert stats["mean_us"] < 100
+
+
+def test_bench_wheel_speeds_batch(bench):
+    rng = np.random.default_rng(0)
+    xs, ys = rng.uniform(-1, 1, 10000), rng.uniform(-1, 1, 10000)
+    stats = bench(lambda: wheel_speeds_batch(xs, ys), rounds=20)
+    bench.record(per_setpoint_ns=stats["mean_us"] * 1e3 / len(xs))
+
+
+def test_bench_jpeg_encode(bench):
+    camera = FakePicamera2()
+    camera.start()
+    frame = camera.capture_array()
+    stats = bench(lambda: encode_jpeg(frame), rounds=20)
+    assert stats["mean_us"] < 1e6
+
+
+def test_bench_motion_gate(bench):
+    camera = FakePicamera2()
+    camera.start()
+    frame = camera.capture_array()
+    gate = MotionGate(keyframe_interval=float("inf"))
+    gate(frame)
+    stats = bench(lambda: gate(frame), rounds=200)
+    # The detector has to be far cheaper than the encode it saves
+    assert stats["mean_us"] < 1e4
+
+
+def test_bench_camera_pipeline_fps(bench):
+    camera = FakePicamera2(fps=60)
+    camera.start()
+    published = []
+    pipeline = CameraPipeline(camera.capture_array, lambda *args: published.append(time.monotonic()), encoders=2)
+    pipeline.start()
+    time.sleep(1.0)
+    pipeline.stop()
+    duration = published[-1] - published[0] if len(published) > 1 else 1.0
+    fps = (len(published) - 1) / duration if len(published) > 1 else 0.0
+    bench.record(fps=fps, captured=camera.frames, published=pipeline.published, dropped=pipeline.dropped)
+    assert pipeline.published > 0
+
+
+@pytest.mark.parametrize("mode", ["stream", "on_demand"])
+def test_bench_vehicle_camera_fps(bench, bus, monkeypatch, mode):
+    # The full camera loop of Vehicle, with the fake camera behind the picamera2 import
+    camera = FakePicamera2()
+    runtime = FakeMake87({"CAMERA_FPS": 60.0, "CAMERA_MODE": mode})
+    runtime.install(monkeypatch)
+    images = runtime.get_publisher("IMAGE", None)
+    for name, module in picamera2_modules(camera).items():
+        monkeypatch.setitem(sys.modules, name, module)
+    vehicle = Vehicle(bus=BusManager(bus=bus))
+    thread = threading.Thread(target=vehicle.publish_camera_image)
+    try:
+        thread.start()
+        time.sleep(1.0)
+    finally:
+        camera.stop()
+        thread.join()
+        vehicle.drive.shutdown()
+        vehicle.servo_control.stop()
+    delivered = len(images.messages) if mode == "stream" else vehicle.frame_ring.latest_id + 1
+    bench.record(fps=delivered, captured=camera.frames, published=len(images.messages))
+    assert delivered > 0
@@ -0,0 +1,210 @@
+import threading
+import time
+
+import pytest
+
+from app.external.Motor import Motor
+from app.external.bus import ADC, EMERGENCY, MOTOR, SERVO, BusManager, bus_priority
+from app.external.servo import Servo
+from test_app.sim import SimBus
+
+
+class GatedBus(SimBus):
+    """SimBus whose next transaction blocks until released, to build up a queue."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+
+    def _transact(self, op, address, register, data):
+        if not self.gate.is_set():
+            self.entered.set()
+            self.gate.wait()
+        return super()._transact(op, address, register, data)
+
+
+@pytest.fixture
+def sim():
+    return GatedBus()
+
+
+@pytest.fixture
+def manager(sim):
+    return BusManager(bus=sim)
+
+
+def start_write(manager, priority, register, value):
+    def write():
+        with bus_priority(priority):
+            manager.write_byte_data(0x48, register, value)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    return thread
+
+
+def wait_queued(manager, count):
+    end = time.monotonic() + 1.0
+    while len(manager._queue) < count and time.monotonic() < end:
+        time.sleep(0.001)
+    assert len(manager._queue) == count
+
+
+def test_devices_are_shared_and_initialized_once(manager, sim):
+    pwm = manager.pca9685(0x40)
+    assert manager.pca9685(0x40) is pwm
+    motor = Motor(pwm=manager.pca9685(0x40), adc=manager.adc())
+    servo = Servo(pwm=manager.pca9685(0x40))
+    assert motor.pwm is servo.PwmServo
+    assert manager.adc() is motor.adc
+    prescale_writes = [t for t in sim.transactions if t.address == 0x40 and t.register == 0xFE]
+    assert len(prescale_writes) == 1
+
+
+def test_reads_return_values(manager, sim):
+    sim.devices[0x40].registers[0x10] = 42
+    assert manager.read_byte_data(0x40, 0x10) == 42
+
+
+def test_transactions_run_in_priority_order(manager, sim):
+    sim.gate.clear()
+    blocker = start_write(manager, ADC, 0x00, 0)
+    assert sim.entered.wait(1.0)
+    threads = []
+    for priority, register in ((ADC, 0x01), (SERVO, 0x02), (MOTOR, 0x03), (EMERGENCY, 0x04)):
+        threads.append(start_write(manager, priority, register, 1))
+        wait_queued(manager, len(threads))
+    sim.gate.set()
+    for thread in [blocker] + threads:
+        thread.join()
+    assert [t.register for t in sim.transactions] == [0x00, 0x04, 0x03, 0x02, 0x01]
+
+
+def test_pending_writes_to_same_device_are_merged(manager, sim):
+    manager.pca9685(0x40)
+    sim.reset()
+    sim.gate.clear()
+    blocker = start_write(manager, ADC, 0x00, 0)
+    assert sim.entered.wait(1.0)
+
+    def write(register, data):
+        with bus_priority(MOTOR):
+            manager.write_i2c_block_data(0x40, register, data)
+
+    first = threading.Thread(target=write, args=(0x06, [1, 2, 3, 4]))
+    first.start()
+    wait_queued(manager, 1)
+    second = threading.Thread(target=write, args=(0x0A, [5, 6, 7, 8]))
+    second.start()
+    deadline = time.monotonic() + 1.0
+    while manager.merged == 0 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    sim.gate.set()
+    for thread in (blocker, first, second):
+        thread.join()
+    pca_writes = [t for t in sim.transactions if t.address == 0x40]
+    assert len(pca_writes) == 1
+    assert pca_writes[0].data == (1, 2, 3, 4, 5, 6, 7, 8)
+    assert sim.devices[0x40].channel(1) == (5 | 6 << 8, 7 | 8 << 8)
+
+
+def test_errors_reach_the_caller(manager, sim):
+    with pytest.raises(KeyError):
+        manager.read_byte(0x99)
+    assert manager.read_byte_data(0x40, 0x00) is not None
+
+
+def test_motor_stop_overtakes_queued_servo_write_on_shared_pca9685(manager, sim):
+    pwm = manager.pca9685(0x40)
+    motor = Motor(pwm=pwm, adc=manager.adc())
+    servo = Servo(pwm=pwm)
+    with bus_priority(MOTOR):
+        motor.setMotorModel(1000, 1000, 1000, 1000)
+    sim.reset()
+    sim.gate.clear()
+    blocker = start_write(manager, ADC, 0x00, 0)
+    assert sim.entered.wait(1.0)
+
+    def move_servo():
+        with bus_priority(SERVO):
+            servo.setServoPwms({"0": 90, "1": 90})
+
+    def stop_motors():
+        with bus_priority(EMERGENCY):
+            motor.setMotorModel(0, 0, 0, 0)
+
+    servo_thread = threading.Thread(target=move_servo)
+    servo_thread.start()
+    stop_thread = threading.Thread(target=stop_motors)
+    try:
+        wait_queued(manager, 1)
+        # The servo write is waiting on the bus, not holding the PCA9685
+        stop_thread.start()
+        wait_queued(manager, 2)
+    finally:
+        sim.gate.set()
+    if stop_thread.ident is None:
+        stop_thread.start()
+    for thread in (blocker, servo_thread, stop_thread):
+        thread.join()
+
+    pca_writes = [t for t in sim.transactions if t.address == 0x40]
+    motor_registers = range(0x06, 0x06 + 4 * 8)
+    assert [t.register in motor_registers for t in pca_writes] == [True, False]
+    assert sim.devices[0x40].channel(1) == (0, 4095)
+    assert sim.devices[0x40].channel(8) == (0, servo.servo_tick("0", 90)[1])
+
+
+def test_pca9685_resends_bytes_after_a_failed_write(sim):
+    pwm = BusManager(bus=sim).pca9685(0x40)
+    failing = sim.write_i2c_block_data
+
+    def fail(*args):
+        raise OSError("bus error")
+
+    sim.write_i2c_block_data = fail
+    with pytest.raises(OSError):
+        pwm.setPWMFrame({0: (0, 1000), 1: (0, 1000)})
+    sim.write_i2c_block_data = failing
+    pwm.setPWMFrame({0: (0, 1000), 1: (0, 1000)})
+    assert sim.devices[0x40].channel(1) == (0, 1000)
+
+
+def test_motor_stop_supersedes_queued_drive_on_same_channels(manager, sim):
+    pwm = manager.pca9685(0x40)
+    motor = Motor(pwm=pwm, adc=manager.adc())
+    sim.gate.clear()
+    blocker = start_write(manager, ADC, 0x00, 0)
+    assert sim.entered.wait(1.0)
+
+    def drive():
+        with bus_priority(MOTOR):
+            motor.setMotorModel(1000, 1000, 1000, 1000)
+
+    def stop():
+        with bus_priority(EMERGENCY):
+            motor.setMotorModel(0, 0, 0, 0)
+
+    drive_thread = threading.Thread(target=drive)
+    stop_thread = threading.Thread(target=stop)
+    drive_thread.start()
+    try:
+        wait_queued(manager, 1)
+        stop_thread.start()
+        wait_queued(manager, 2)
+    finally:
+        sim.gate.set()
+    if stop_thread.ident is None:
+        stop_thread.start()
+    for thread in (blocker, drive_thread, stop_thread):
+        thread.join()
+
+    device = sim.devices[0x40]
+    # The stop ran first, but the older drive write must not undo it
+    assert [device.channel(channel) for channel in range(8)] == [(0, 4095)] * 8
+    assert pwm._shadow[:32] == device.registers[0x06:0x06 + 32]
+    sim.reset()
+    motor.setMotorModel(0, 0, 0, 0)
+    assert not sim.transactions
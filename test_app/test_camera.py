@@ -0,0 +1,256 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from app.camera import CameraPipeline, FrameQueue, FrameRing, LazyEncoder, MotionGate, encode_jpeg
+
+
+class FrameSource:
+    """Capture mock producing numbered synthetic frames, then failing to end the stream."""
+
+    def __init__(self, count, size=(48, 64)):
+        self.count = count
+        self.size = size
+        self.captured = 0
+
+    def __call__(self):
+        if self.captured >= self.count:
+            raise RuntimeError("end of stream")
+        frame = np.full((*self.size, 3), self.captured % 256, dtype=np.uint8)
+        self.captured += 1
+        return frame
+
+
+class Sink:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.frames = []
+
+    def __call__(self, frame_id, captured_at, data):
+        time.sleep(self.delay)
+        self.frames.append((frame_id, data))
+
+
+def run_pipeline(pipeline):
+    pipeline.start()
+    done = threading.Thread(target=pipeline.join)
+    done.start()
+    done.join(timeout=5.0)
+    assert not done.is_alive()
+
+
+def test_encode_jpeg_roundtrip():
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    data = encode_jpeg(frame, quality=80)
+    decoded = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == frame.shape
+
+
+def test_lower_quality_is_smaller():
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    assert len(encode_jpeg(frame, quality=30)) < len(encode_jpeg(frame, quality=95))
+
+
+def test_frame_queue_drops_oldest():
+    queue = FrameQueue(2)
+    for i in range(5):
+        queue.put(i)
+    assert queue.dropped == 3
+    assert queue.get() == 3
+    assert queue.get() == 4
+    queue.close()
+    assert queue.get() is None
+
+
+def test_pipeline_publishes_in_capture_order():
+    sink = Sink()
+    pipeline = CameraPipeline(FrameSource(30), sink, encoders=3, queue_size=64, fps=500)
+    run_pipeline(pipeline)
+    ids = [frame_id for frame_id, _ in sink.frames]
+    assert ids == sorted(ids)
+    assert len(ids) + pipeline.dropped == 30
+    assert pipeline.published == len(ids)
+
+
+def test_pipeline_drops_frames_when_sink_is_slow():
+    sink = Sink(delay=0.02)
+    pipeline = CameraPipeline(FrameSource(100), sink, encoders=2, queue_size=2)
+    run_pipeline(pipeline)
+    ids = [frame_id for frame_id, _ in sink.frames]
+    assert ids == sorted(ids)
+    assert pipeline.dropped > 0
+    assert len(ids) < 100
+
+
+def test_pipeline_stop():
+    pipeline = CameraPipeline(lambda: np.zeros((8, 8, 3), dtype=np.uint8), Sink(), fps=100)
+    pipeline.start()
+    time.sleep(0.05)
+    pipeline.stop()
+    assert pipeline.published > 0
+
+
+def frame_of(value, shape=(48, 64, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_frame_ring_keeps_latest_frames_without_reallocating():
+    ring = FrameRing(3)
+    ring.push(frame_of(0))
+    buffer = ring._frames
+    for i in range(1, 5):
+        ring.push(frame_of(i))
+    assert ring._frames is buffer
+    assert ring.latest_id == 4
+    with ring.frame(4) as frame:
+        assert frame[0, 0, 0] == 4
+    with ring.frame(1) as frame:
+        assert frame is None
+
+
+def test_frame_ring_wait():
+    ring = FrameRing(2)
+    assert not ring.wait(timeout=0.01)
+    threading.Timer(0.02, ring.push, args=(frame_of(1),)).start()
+    assert ring.wait(timeout=1.0)
+    assert ring.latest_id == 0
+
+
+def test_lazy_encoder_without_frames():
+    encoder = LazyEncoder(FrameRing(2), lambda frame_id, data: (frame_id, data))
+    assert encoder.get() is None
+
+
+def test_lazy_encoder_memoizes_per_frame_and_variant():
+    ring = FrameRing(2)
+    encoder = LazyEncoder(ring, lambda frame_id, data: (frame_id, data))
+    ring.push(frame_of(10))
+    first = encoder.get()
+    assert encoder.get() is first
+    assert encoder.encodes == 1
+
+    small = encoder.get(scale=0.5)
+    low = encoder.get(quality=30)
+    assert encoder.encodes == 3
+    decoded = cv2.imdecode(np.frombuffer(small[1], dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == (24, 32, 3)
+    assert low is not first
+
+    ring.push(frame_of(20))
+    assert encoder.get()[0] == 1
+    assert encoder.encodes == 4
+
+
+def test_lazy_encoder_sanitizes_variant_requests():
+    ring = FrameRing(2)
+    encoder = LazyEncoder(ring, lambda frame_id, data: (frame_id, data), min_size=16)
+    ring.push(frame_of(10))
+    full = encoder.get()
+    for scale in (-0.5, 0.0, 1.5, float("nan")):
+        assert encoder.get(scale=scale) is full
+    assert encoder.get(quality=float("nan")) is full
+    assert encoder.get(quality=500) is encoder.get(quality=100)
+    assert encoder.get(quality=-3) is encoder.get(quality=1)
+    tiny = encoder.get(scale=0.0005)
+    decoded = cv2.imdecode(np.frombuffer(tiny[1], dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == (16, 21, 3)
+    assert encoder.encodes == 4
+
+
+def test_lazy_encoder_shares_concurrent_encode():
+    ring = FrameRing(2)
+    calls = []
+
+    def make_message(frame_id, data):
+        calls.append(frame_id)
+        time.sleep(0.05)
+        return frame_id, data
+
+    encoder = LazyEncoder(ring, make_message)
+    ring.push(frame_of(5))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(encoder.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [0]
+    assert all(result is results[0] for result in results)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_motion_gate_skips_static_scene_until_keyframe():
+    clock = Clock()
+    gate = MotionGate(keyframe_interval=5.0, clock=clock)
+    assert gate(frame_of(100)) == (95, 1.0)
+    for _ in range(10):
+        clock.now += 0.1
+        # Sensor noise below the change threshold is not motion
+        assert gate(frame_of(105)) is None
+    assert gate.skipped == 10
+    clock.now = 5.0
+    assert gate(frame_of(105)) == (95, 1.0)
+
+
+def test_motion_gate_throttles_changes_while_idle():
+    clock = Clock()
+    gate = MotionGate(idle_quality=60, idle_scale=0.5, idle_fps=4.0, clock=clock)
+    gate(frame_of(0))
+    published = []
+    for i in range(1, 20):
+        clock.now = i * 0.0625
+        if gate(frame_of(i * 10)) is not None:
+            published.append(i)
+    # Every frame changed, but only one per 0.25s goes out
+    assert published == [4, 8, 12, 16]
+    assert gate(frame_of(255)) is None
+    clock.now += 0.25
+    assert gate(frame_of(0)) == (60, 0.5)
+
+
+def test_motion_gate_detects_partial_change():
+    gate = MotionGate(motion_threshold=0.05, idle_fps=0.0, clock=Clock())
+    frame = frame_of(50, shape=(480, 640, 3))
+    gate(frame)
+    frame[:20, :20] = 200  # ~0.1% of the image
+    assert gate(frame) is None
+    frame[:200, :200] = 200  # ~13% of the image
+    assert gate(frame) == (70, 1.0)
+
+
+def test_motion_gate_publishes_every_frame_while_active():
+    clock = Clock()
+    moving = [True]
+    gate = MotionGate(active=lambda: moving[0], active_hold=0.5, clock=clock)
+    for _ in range(5):
+        clock.now += 0.05
+        assert gate(frame_of(0)) == (95, 1.0)
+    moving[0] = False
+    clock.now += 0.4
+    assert gate(frame_of(0)) == (95, 1.0)
+    clock.now += 0.2
+    assert gate(frame_of(0)) is None
+
+
+def test_pipeline_encodes_with_gate_decision():
+    sink = Sink()
+    decisions = iter([(95, 1.0), None, None, (40, 0.5)] * 5)
+    pipeline = CameraPipeline(FrameSource(20), sink, queue_size=64, gate=lambda frame: next(decisions))
+    run_pipeline(pipeline)
+    ids = [frame_id for frame_id, _ in sink.frames]
+    assert set(ids) <= {0, 3, 4, 7, 8, 11, 12, 15, 16, 19}
+    # Skipped frames never reach the queue, so they do not count as dropped
+    assert len(ids) + pipeline.dropped == 10
+    for frame_id, data in sink.frames:
+        shape = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR).shape
+        assert shape == ((48, 64, 3) if frame_id % 4 == 0 else (24, 32, 3))
@@ -0,0 +1,178 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from make87_messages.tensor.vector_3_pb2 import Vector3
+
+from app.drive import DriveScheduler, wheel_speeds, wheel_speeds_batch
+from app.main import Vehicle
+
+
+class RecordingMotor:
+    """Motor mock that records every speed update."""
+
+    def __init__(self):
+        self.calls = []
+        self.changed = threading.Event()
+
+    def setMotorModel(self, front_left, rear_left, front_right, rear_right):
+        self.calls.append((front_left, front_right))
+        self.changed.set()
+
+    def wait_for(self, speeds, timeout=1.0):
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            if self.calls and self.calls[-1] == speeds:
+                return True
+            self.changed.wait(0.01)
+            self.changed.clear()
+        return False
+
+
+class NullServo:
+    """Servo mock that ignores all updates."""
+
+    def setServoPwm(self, channel, angle):
+        pass
+
+    def setServoPwms(self, angles):
+        pass
+
+
+@pytest.fixture
+def motor():
+    return RecordingMotor()
+
+
+@pytest.fixture
+def scheduler(motor):
+    s = DriveScheduler(motor)
+    s.start()
+    yield s
+    s.shutdown()
+
+
+def test_submit_returns_immediately(scheduler, motor):
+    start = time.monotonic()
+    scheduler.submit(500, 500, 5.0)
+    assert time.monotonic() - start < 0.1
+    assert motor.wait_for((500, 500))
+
+
+def test_watchdog_stops_after_deadline(scheduler, motor):
+    scheduler.submit(500, -500, 0.05)
+    assert motor.wait_for((500, -500))
+    assert motor.wait_for((0, 0))
+    assert scheduler.deadline is None
+
+
+def test_newer_command_preempts(scheduler, motor):
+    scheduler.submit(500, 500, 0.05)
+    scheduler.submit(-300, 300, 5.0)
+    assert motor.wait_for((-300, 300))
+    time.sleep(0.15)
+    assert motor.calls[-1] == (-300, 300)
+
+
+def test_halt(scheduler, motor):
+    scheduler.submit(500, 500, 5.0)
+    assert motor.wait_for((500, 500))
+    scheduler.halt()
+    assert motor.wait_for((0, 0))
+
+
+def test_shutdown_stops_motors(motor):
+    s = DriveScheduler(motor)
+    s.start()
+    s.submit(500, 500, 5.0)
+    assert motor.wait_for((500, 500))
+    s.shutdown()
+    assert motor.calls[-1] == (0, 0)
+
+
+def test_vehicle_drive_instruction_does_not_block(motor):
+    v = Vehicle(servo=NullServo(), motor=motor)
+    try:
+        start = time.monotonic()
+        v.handle_drive_instruction(Vector3(x=0.0, y=1.0, z=2.0))
+        assert time.monotonic() - start < 0.1
+        assert motor.wait_for((1000, 1000))
+    finally:
+        v.drive.shutdown()
+        v.servo_control.stop()
+
+
+def reference_wheel_speeds(x, y, max_speed=1000):
+    vector = np.array([x, y], dtype=float)
+    mag = np.linalg.norm(vector)
+    if mag > 1:
+        vector /= mag
+    left = vector[1] + vector[0]
+    right = vector[1] - vector[0]
+    max_val = max(abs(left), abs(right))
+    if max_val > 1:
+        left /= max_val
+        right /= max_val
+    return int(left * max_speed), int(right * max_speed)
+
+
+def test_wheel_speeds_match_reference():
+    grid = np.linspace(-2.0, 2.0, 41)
+    for x in grid:
+        for y in grid:
+            # np.linalg.norm may differ in the last ulp, which can truncate one unit lower
+            left, right = wheel_speeds(float(x), float(y))
+            ref_left, ref_right = reference_wheel_speeds(x, y)
+            assert abs(left - ref_left) <= 1 and abs(right - ref_right) <= 1
+
+
+def test_wheel_speeds_batch_matches_scalar():
+    rng = np.random.default_rng(0)
+    xs, ys = rng.uniform(-2, 2, 1000), rng.uniform(-2, 2, 1000)
+    left, right = wheel_speeds_batch(xs, ys)
+    assert left.shape == right.shape == (1000,)
+    for i in range(1000):
+        assert (left[i], right[i]) == wheel_speeds(xs[i], ys[i])
+
+
+def test_ramp_limits_acceleration(scheduler, motor):
+    scheduler.rate = 100.0
+    scheduler.submit(1000, 1000, 5.0, accel=4000.0)
+    assert motor.wait_for((1000, 1000))
+    lefts = [left for left, _ in motor.calls]
+    steps = np.diff([0] + lefts)
+    assert len(lefts) > 5
+    assert steps.max() <= 4000.0 / 100.0 + 1
+
+
+def test_ramp_down_when_stream_goes_quiet(scheduler, motor):
+    scheduler.submit(500, 500, 0.2, accel=10000.0)
+    assert motor.wait_for((500, 500))
+    motor.calls.clear()
+    assert motor.wait_for((0, 0))
+    assert len(motor.calls) > 1
+
+
+def test_halt_skips_ramp(scheduler, motor):
+    scheduler.submit(1000, 1000, 5.0, accel=100000.0)
+    assert motor.wait_for((1000, 1000))
+    motor.calls.clear()
+    scheduler.halt()
+    assert motor.wait_for((0, 0))
+    assert motor.calls == [(0, 0)]
+
+
+def test_vehicle_setpoint_stream(motor):
+    v = Vehicle(servo=NullServo(), motor=motor)
+    v.setpoint_timeout = 0.1
+    v.setpoint_accel = 0.0
+    try:
+        for _ in range(5):
+            v.handle_drive_setpoint(Vector3(x=0.0, y=0.5))
+            time.sleep(0.02)
+        assert motor.calls[-1] == (500, 500)
+        assert motor.wait_for((0, 0))
+    finally:
+        v.drive.shutdown()
+        v.servo_control.stop()
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from app.camera import CameraPipeline
+from app.external.bus import BusManager
+from app.metrics import Histogram, Metrics, metrics
+from test_app.sim import SimBus
+
+
+@pytest.fixture
+def global_metrics():
+    metrics.enabled = True
+    metrics.reset()
+    yield metrics
+    metrics.reset()
+
+
+def test_histogram_summary():
+    histogram = Histogram()
+    for ms in range(1, 101):
+        histogram.observe(ms / 1000)
+    summary = histogram.snapshot()
+    assert summary["count"] == 100
+    assert summary["mean_ms"] == pytest.approx(50.5)
+    assert summary["min_ms"] == pytest.approx(1.0)
+    assert summary["max_ms"] == pytest.approx(100.0)
+    assert 20 <= summary["p50_ms"] <= 100
+    assert summary["p95_ms"] == pytest.approx(100.0)
+
+
+def test_snapshot_and_reset():
+    m = Metrics()
+    m.count("requests")
+    m.count("bytes", 10)
+    m.observe("latency", 0.002)
+    snapshot = m.snapshot(reset=True)
+    assert snapshot["counters"]["requests"]["value"] == 1
+    assert snapshot["counters"]["bytes"]["value"] == 10
+    assert snapshot["latency"]["latency"]["count"] == 1
+    assert m.snapshot() == {"interval_s": pytest.approx(0, abs=1), "counters": {}, "latency": {}}
+
+
+def test_disabled_is_noop():
+    m = Metrics(enabled=False)
+    m.count("requests")
+    m.observe("latency", 0.002)
+    with m.timer("block"):
+        pass
+    assert m.timed("call", lambda x: x * 2)(21) == 42
+    snapshot = m.snapshot()
+    assert snapshot["counters"] == {} and snapshot["latency"] == {}
+
+
+def test_timed_wrapper_records_latency():
+    m = Metrics()
+    wrapped = m.timed("endpoint.TEST", lambda x: x + 1)
+    assert wrapped(1) == 2
+    assert m.snapshot()["latency"]["endpoint.TEST"]["count"] == 1
+
+
+def test_bus_transactions_are_counted_per_device(global_metrics):
+    manager = BusManager(bus=SimBus())
+    pwm = manager.pca9685(0x40)
+    global_metrics.reset()
+    pwm.setPWM(0, 0, 1000)
+    manager.read_byte_data(0x48, 0x84)
+    snapshot = global_metrics.snapshot()
+    assert snapshot["counters"]["i2c.0x40.transactions"]["value"] == 1
+    assert snapshot["counters"]["i2c.0x40.bytes"]["value"] == 5  # register + 4 LED0 bytes
+    assert snapshot["counters"]["i2c.0x48.transactions"]["value"] == 1
+    assert snapshot["latency"]["i2c.0x40"]["count"] == 1
+
+
+def test_camera_pipeline_metrics(global_metrics):
+    frames = iter(range(20))
+
+    def capture():
+        next(frames)
+        return np.zeros((32, 32, 3), dtype=np.uint8)
+
+    pipeline = CameraPipeline(capture, lambda *args: None, queue_size=64)
+    pipeline.start()
+    pipeline.join()
+    snapshot = global_metrics.snapshot()
+    assert snapshot["counters"]["camera.frames_captured"]["value"] == 20
+    published = snapshot["counters"]["camera.frames_published"]["value"]
+    dropped = snapshot["counters"].get("camera.frames_dropped", {"value": 0})["value"]
+    assert published + dropped == 20
+    for name in ("camera.capture", "camera.encode", "camera.publish", "camera.capture_to_publish"):
+        assert snapshot["latency"][name]["count"] > 0
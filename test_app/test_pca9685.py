@@ -0,0 +1,83 @@
+import pytest
+
+from app.external.Motor import Motor
+from app.external.PCA9685 import PCA9685
+from app.external.servo import Servo
+from test_app.sim import SimBus, Transaction
+
+
+@pytest.fixture
+def bus():
+    return SimBus()
+
+
+def channel_value(bus, channel):
+    return bus.devices[0x40].channel(channel)
+
+
+@pytest.fixture
+def pwm(bus):
+    pwm = PCA9685(0x40, bus=bus)
+    bus.reset()
+    return pwm
+
+
+@pytest.fixture
+def motor(pwm):
+    m = Motor(pwm=pwm, adc=object())
+    pwm.bus.reset()
+    return m
+
+
+def test_auto_increment_enabled(bus):
+    PCA9685(0x40, bus=bus)
+    assert bus.devices[0x40].registers[0x00] & 0x20
+
+
+def test_set_pwm_single_block(pwm, bus):
+    pwm.setPWM(3, 0, 1234)
+    assert len(bus.transactions) == 1
+    assert channel_value(bus, 3) == (0, 1234)
+
+
+def test_unchanged_frame_is_not_sent(pwm, bus):
+    pwm.setPWM(3, 0, 1234)
+    bus.reset()
+    pwm.setPWM(3, 0, 1234)
+    assert bus.transactions == []
+
+
+def test_only_changed_registers_sent(pwm, bus):
+    pwm.setPWM(3, 0, 1234)
+    bus.reset()
+    pwm.setPWM(3, 0, 1235)
+    assert bus.transactions == [Transaction("write_byte_data", 0x40, 0x06 + 4 * 3 + 2, (1235 & 0xFF,))]
+
+
+def test_motor_model_full_update(motor, bus):
+    motor.setMotorModel(2000, 2000, -1500, -1500)
+    assert len(bus.transactions) <= 2
+    assert channel_value(bus, 1) == (0, 2000)
+    assert channel_value(bus, 0) == (0, 0)
+    assert channel_value(bus, 2) == (0, 2000)
+    assert channel_value(bus, 7) == (0, 0)
+    assert channel_value(bus, 6) == (0, 1500)
+    assert channel_value(bus, 4) == (0, 1500)
+
+
+def test_motor_stop_after_drive(motor, bus):
+    motor.setMotorModel(2000, 2000, 2000, 2000)
+    bus.reset()
+    motor.setMotorModel(0, 0, 0, 0)
+    assert len(bus.transactions) <= 2
+    for channel in range(8):
+        assert channel_value(bus, channel) == (0, 4095)
+
+
+def test_servo_pair_single_transaction(pwm, bus):
+    servo = Servo(pwm=pwm)
+    bus.reset()
+    servo.setServoPwms({"0": 75, "1": 135})
+    assert len(bus.transactions) == 1
+    assert channel_value(bus, 8) == (0, int((2500 - int(85 / 0.09)) * 4096 / 20000))
+    assert channel_value(bus, 9) == (0, int((500 + int(145 / 0.09)) * 4096 / 20000))
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from app.external.PCA9685 import PCA9685
+from app.external.servo import Servo
+from app.servo_control import ServoController
+from test_app.sim import SimBus
+
+
+class RecordingServo:
+    """Servo mock that records every batch of angles written."""
+
+    def __init__(self):
+        self.writes = []
+
+    def setServoPwms(self, angles):
+        self.writes.append(dict(angles))
+
+
+@pytest.fixture
+def servo():
+    return Servo(pwm=PCA9685(0x40, bus=SimBus()))
+
+
+@pytest.mark.parametrize("channel", Servo.CHANNELS)
+def test_tick_table_matches_pulse_formula(servo, channel):
+    for angle in range(0, 181):
+        pwm_channel, pulse = Servo.servo_pulse(channel, angle)
+        assert servo.servo_tick(channel, angle) == (pwm_channel, int(pulse * 4096 / 20000))
+
+
+def test_servo_pwm_uses_ticks(servo):
+    servo.setServoPwm("0", 75.7)
+    assert servo.PwmServo.bus.devices[0x40].channel(8) == (0, servo.ticks["0"][1][75])
+
+
+def test_flush_writes_targets():
+    servo = RecordingServo()
+    controller = ServoController(servo, {"0": 75.0, "1": 135.0})
+    controller.flush()
+    assert servo.writes == [{"0": 75.0, "1": 135.0}]
+    controller.flush()
+    assert len(servo.writes) == 1
+
+
+def test_latest_target_wins_and_writes_are_coalesced():
+    servo = RecordingServo()
+    controller = ServoController(servo, {"0": 75.0, "1": 135.0}, rate=20.0)
+    controller.flush()
+    controller.start()
+    try:
+        for yaw in range(76, 126):
+            controller.set_targets({"0": float(yaw)})
+        time.sleep(0.15)
+    finally:
+        controller.stop()
+    assert servo.writes[-1] == {"0": 125.0}
+    assert len(servo.writes) < 10
+
+
+def test_unchanged_whole_degree_is_not_written():
+    servo = RecordingServo()
+    controller = ServoController(servo, {"0": 75.0})
+    controller.flush()
+    controller.set_targets({"0": 75.4})
+    controller.flush()
+    assert len(servo.writes) == 1
+
+
+def test_slew_rate_limits_motion():
+    servo = RecordingServo()
+    controller = ServoController(servo, {"0": 0.0}, slew=100.0)
+    controller.flush()
+    assert not controller.moving
+    controller.set_targets({"0": 50.0})
+    assert controller.moving
+    assert controller._step(0.1)
+    assert servo.writes[-1] == {"0": pytest.approx(10.0)}
+    for _ in range(4):
+        controller._step(0.1)
+    assert not controller._step(0.1)
+    assert servo.writes[-1] == {"0": pytest.approx(50.0)}
+    assert not controller.moving
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from app.external.ADC import Adc
+from app.telemetry import BATTERY_CHANNEL, TelemetrySampler
+from test_app.sim import SimADC, SimBus
+
+
+def make_adc(chip="ADS7830", noise=0, values=None):
+    return Adc(bus=SimBus(devices={0x48: SimADC(chip, values=values, noise=noise)}))
+
+
+@pytest.mark.parametrize("chip", ["ADS7830", "PCF8591"])
+def test_recv_adc_gives_up_on_noisy_channel(chip):
+    adc = make_adc(chip, noise=50)
+    adc.bus.reset()
+    adc.recvADC(2)
+    reads_per_try = 2 if chip == "ADS7830" else 18
+    assert len(adc.bus.transactions) <= 1 + adc.retries * reads_per_try
+
+
+@pytest.mark.parametrize("chip", ["ADS7830", "PCF8591"])
+def test_sample_adc_is_single_conversion(chip):
+    adc = make_adc(chip)
+    adc.bus.reset()
+    assert adc.sampleADC(2) == pytest.approx(adc.recvADC(2), abs=0.02)
+    adc.bus.reset()
+    adc.sampleADC(2)
+    assert len(adc.bus.transactions) == 2
+
+
+def test_sampler_before_first_sample():
+    sampler = TelemetrySampler(make_adc())
+    assert sampler.latest(BATTERY_CHANNEL) is None
+    assert sampler.battery_voltage() is None
+
+
+def test_sampler_filters_outliers():
+    adc = make_adc(values=[128, 128, 170, 0, 0, 0, 0, 255])
+    sampler = TelemetrySampler(adc, window=5, alpha=1.0)
+    for _ in range(4):
+        sampler.sample()
+    adc.bus.devices[0x48].values[2] = 0  # single glitch
+    sampler.sample()
+    assert sampler.battery_voltage() == pytest.approx(170 / 255.0 * 3.3 * 3, abs=0.05)
+
+
+def test_sampler_smooths_noise():
+    adc = make_adc(noise=20)
+    sampler = TelemetrySampler(adc, window=5, alpha=0.3)
+    raw = []
+    for _ in range(50):
+        raw.append(adc.sampleADC(BATTERY_CHANNEL))
+        sampler.sample()
+    expected = 170 / 255.0 * 3.3
+    assert abs(sampler.latest(BATTERY_CHANNEL) - expected) < max(abs(r - expected) for r in raw)
+    assert sampler.latest(BATTERY_CHANNEL) == pytest.approx(expected, abs=0.15)
+
+
+def test_sampler_thread_publishes():
+    published = []
+    sampler = TelemetrySampler(make_adc(), rate=100.0, publish=published.append)
+    sampler.start()
+    time.sleep(0.1)
+    sampler.stop()
+    assert len(published) > 1
+    assert set(published[-1]) == {0, 1, 2}
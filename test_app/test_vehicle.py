@@ -1,9 +1,17 @@
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+from make87_messages.core.empty_pb2 import Empty
 from make87_messages.tensor.vector_2_pb2 import Vector2
 
 from app.main import Vehicle
 
 import pytest
 from app.external.servo import Servo
+from test_app.sim import FakeMake87, FakePicamera2, FakeTopic, picamera2_modules
 
 
 class DummyServo(Servo):
@@ -15,6 +23,10 @@ class DummyServo(Servo):
     def setServoPwm(self, channel, angle):
         self.angles[str(channel)] = angle
 
+    def setServoPwms(self, angles):
+        for channel, angle in angles.items():
+            self.setServoPwm(channel, angle)
+
 
 class DummyMotor:
     """Motor mock to avoid hardware calls."""
@@ -26,7 +38,9 @@ class DummyMotor:
 @pytest.fixture
 def vehicle():
     v = Vehicle(servo=DummyServo(), motor=DummyMotor())
-    return v
+    yield v
+    v.drive.shutdown()
+    v.servo_control.stop()
 
 
 def test_camera_initial_angles(vehicle):
@@ -36,6 +50,7 @@ def test_camera_initial_angles(vehicle):
 
 def test_yaw_right(vehicle):
     vehicle.handle_set_camera_direction(Vector2(x=10.0, y=0.0))
+    vehicle.servo_control.flush()
     assert vehicle.yaw == pytest.approx(85.0)
     assert vehicle.camera_servo.angles["0"] == 85.0  # yaw
     assert vehicle.camera_servo.angles["1"] == 135.0  # pitch unchanged
@@ -43,6 +58,7 @@ def test_yaw_right(vehicle):
 
 def test_pitch_down(vehicle):
     vehicle.handle_set_camera_direction(Vector2(x=0.0, y=10.0))
+    vehicle.servo_control.flush()
     assert vehicle.pitch == pytest.approx(145.0)
     assert vehicle.camera_servo.angles["1"] == 145.0  # pitch
     assert vehicle.camera_servo.angles["0"] == 75.0  # yaw unchanged
@@ -51,12 +67,14 @@ def test_pitch_down(vehicle):
 def test_yaw_limit_right(vehicle):
     # Try to exceed yaw max limit
     vehicle.handle_set_camera_direction(Vector2(x=100.0, y=0.0))
+    vehicle.servo_control.flush()
     assert vehicle.yaw == 149.0  # clamped
     assert vehicle.camera_servo.angles["0"] == 149.0
 
 
 def test_pitch_limit_down(vehicle):
     vehicle.handle_set_camera_direction(Vector2(x=0.0, y=100.0))
+    vehicle.servo_control.flush()
     assert vehicle.pitch == 159.0  # clamped
     assert vehicle.camera_servo.angles["1"] == 159.0
 
@@ -105,3 +123,135 @@ def test_wheel_speeds_diagonal_left():
     left, right = Vehicle.compute_wheel_speeds(-0.5, 0.5)
     assert left == 0
     assert right == 1000
+
+
+class CameraRun:
+    """Runs `Vehicle.publish_camera_image` against a fake camera and make87 runtime."""
+
+    def __init__(self, monkeypatch, vehicle, config):
+        self.vehicle = vehicle
+        self.camera = FakePicamera2()
+        self.make87 = FakeMake87(config)
+        self.make87.install(monkeypatch)
+        self.images = self.make87.get_publisher("IMAGE", None)
+        for name, module in picamera2_modules(self.camera).items():
+            monkeypatch.setitem(sys.modules, name, module)
+        self.thread = threading.Thread(target=vehicle.publish_camera_image)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        # Capturing from a stopped camera fails, which ends the camera loop
+        self.camera.stop()
+        self.thread.join(timeout=5.0)
+        assert not self.thread.is_alive()
+
+    def wait_for_frames(self, count, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while self.camera.frames < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return self.camera.frames >= count
+
+
+def decoded_shape(message):
+    return cv2.imdecode(np.frombuffer(message.data, dtype=np.uint8), cv2.IMREAD_COLOR).shape
+
+
+CAMERA_CONFIG = {"CAMERA_WIDTH": 160, "CAMERA_HEIGHT": 120, "CAMERA_FPS": 100.0}
+
+
+def test_stream_mode_publishes_camera_images(monkeypatch, vehicle):
+    with CameraRun(monkeypatch, vehicle, CAMERA_CONFIG) as run:
+        assert run.images.wait_for(5)
+        assert decoded_shape(vehicle.handle_get_latest_camera_image(Empty())) == (120, 160, 3)
+        # Raw frames are only kept once a variant has been requested
+        assert vehicle.frame_ring.latest_id is None
+        variant = vehicle.handle_get_camera_image_variant(Vector2(x=50.0, y=0.5))
+        assert decoded_shape(variant) == (60, 80, 3)
+
+
+def test_concurrent_first_variant_requests_all_get_an_image(monkeypatch, vehicle):
+    with CameraRun(monkeypatch, vehicle, CAMERA_CONFIG) as run:
+        assert run.images.wait_for(1)
+        results = []
+        request = Vector2(x=50.0, y=0.5)
+        threads = [
+            threading.Thread(target=lambda: results.append(vehicle.handle_get_camera_image_variant(request)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(results) == 4
+    assert all(message.data for message in results)
+
+
+def test_on_demand_mode_encodes_only_requested_frames(monkeypatch, vehicle):
+    with CameraRun(monkeypatch, vehicle, {**CAMERA_CONFIG, "CAMERA_MODE": "on_demand"}) as run:
+        assert run.wait_for_frames(5)
+        assert decoded_shape(vehicle.handle_get_latest_camera_image(Empty())) == (120, 160, 3)
+        assert vehicle.frame_encoder.encodes == 1
+    assert not run.images.messages
+
+
+def test_invalid_servo_rate_is_rejected(monkeypatch, vehicle):
+    FakeMake87({"SERVO_UPDATE_RATE": 0.0, "SERVO_SLEW_RATE": 90.0}).install(monkeypatch)
+    vehicle.configure()
+    assert vehicle.servo_control.rate == 50.0
+    assert vehicle.servo_control.slew == 90.0
+    # The controller thread keeps running and moves the servo on its own
+    vehicle.handle_set_camera_direction(Vector2(x=10.0, y=0.0))
+    deadline = time.monotonic() + 2.0
+    while vehicle.camera_servo.angles["0"] != 85.0 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert vehicle.camera_servo.angles["0"] == 85.0
+
+
+def test_invalid_idle_scale_publishes_full_frames(monkeypatch, vehicle):
+    config = {**CAMERA_CONFIG, "CAMERA_MODE": "adaptive", "CAMERA_IDLE_SCALE": 0.0, "CAMERA_IDLE_FPS": 0.0}
+    with CameraRun(monkeypatch, vehicle, config) as run:
+        # The fake camera's gradient moves every frame, so idle frames keep being published
+        assert run.images.wait_for(5)
+    assert all(decoded_shape(message) == (120, 160, 3) for message in run.images.messages)
+
+
+class StopPublishing(BaseException):
+    """Escapes the publishing loop's `except Exception` to end the test."""
+
+
+class FlakyTopic(FakeTopic):
+    """Fails the first publish and ends the publishing thread after `count` messages."""
+
+    def __init__(self, count):
+        super().__init__()
+        self.count = count
+        self.calls = 0
+
+    def publish(self, message):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("publish failed")
+        super().publish(message)
+        if len(self.messages) >= self.count:
+            raise StopPublishing
+
+
+def test_metrics_publishing_survives_errors(monkeypatch, vehicle):
+    runtime = FakeMake87()
+    runtime.install(monkeypatch)
+    topic = runtime.topics["METRICS"] = FlakyTopic(count=2)
+
+    def publish():
+        try:
+            vehicle.publish_metrics(0.001)
+        except StopPublishing:
+            pass
+
+    thread = threading.Thread(target=publish)
+    thread.start()
+    thread.join(timeout=2.0)
+    assert not thread.is_alive()
+    assert len(topic.messages) == 2